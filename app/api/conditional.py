@@ -0,0 +1,118 @@
+"""
+条件请求工具
+根据用户的 id 与 updated_at 生成弱 ETag，处理 If-None-Match 并返回 304
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+
+from starlette.responses import Response
+
+from app.models.user import User
+from app.schemas.user import UserResponse
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+# 响应字段变化后（升级部署），旧 ETag 自动失效
+_SCHEMA_TAG = hashlib.blake2b(",".join(UserResponse.model_fields).encode(), digest_size=2).hexdigest()
+
+# 客户端每次使用前都要重新验证，共享缓存不得保存
+CACHE_CONTROL = "private, no-cache"
+
+
+def _microseconds(value: Optional[datetime]) -> int:
+    """时间转换为微秒时间戳（UTCDateTime 列读出的时间均带时区）"""
+    if value is None:
+        return 0
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def user_etag(user: User) -> str:
+    """
+    单个用户的弱 ETag
+
+    Args:
+        user: 用户对象
+
+    Returns:
+        str: 形如 W/"u-1-18a2b3c4d5e6f-3c1a" 的 ETag
+    """
+    return f'W/"u-{user.id}-{_microseconds(user.updated_at):x}-{_SCHEMA_TAG}"'
+
+
+def page_etag(count: int, max_id: Optional[int], id_sum: int, max_updated_at: Optional[datetime]) -> str:
+    """
+    用户列表一页的弱 ETag
+
+    由页内记录数、最大 ID、ID 之和与最大 updated_at 组成：
+    页内有用户被修改、删除或新增时其中至少一项会变化。
+
+    Args:
+        count: 页内记录数
+        max_id: 页内最大 ID
+        id_sum: 页内 ID 之和
+        max_updated_at: 页内最大 updated_at
+
+    Returns:
+        str: 弱 ETag
+    """
+    digest = hashlib.blake2b(
+        f"{count}:{max_id}:{id_sum}:{_microseconds(max_updated_at)}".encode(), digest_size=8,
+    ).hexdigest()
+    return f'W/"l-{digest}-{_SCHEMA_TAG}"'
+
+
+def users_etag(users: Iterable[User]) -> str:
+    """根据已加载的用户列表计算与 page_etag 相同的 ETag"""
+    users = list(users)
+    if not users:
+        return page_etag(0, None, 0, None)
+    return page_etag(
+        len(users),
+        max(user.id for user in users),
+        sum(user.id for user in users),
+        max((user.updated_at for user in users), key=_microseconds),
+    )
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    按弱比较判断 If-None-Match 是否命中
+
+    Args:
+        if_none_match: If-None-Match 请求头
+        etag: 当前资源的 ETag
+
+    Returns:
+        bool: 命中时应返回 304
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    304 响应（不含响应体）
+
+    Args:
+        etag: 当前资源的 ETag
+        headers: 其他需要随 304 更新的响应头
+
+    Returns:
+        Response: 304 响应
+    """
+    return Response(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": CACHE_CONTROL, **(headers or {})},
+    )
@@ -2,28 +2,35 @@
 API 依赖注入模块
 定义路由处理函数的公共依赖
 """
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.cache import principal_cache
+from app.core.database import get_db, use_primary
 from app.core.security import oauth2_scheme, decode_access_token
 from app.crud.user import user_crud
-from app.models.user import User
+from app.schemas.user import Principal
 
 
 async def get_current_user(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     token: str = Depends(oauth2_scheme)
-) -> User:
+) -> Principal:
     """
     获取当前认证用户
     
+    返回只读的 Principal（不绑定数据库会话），需要修改当前用户的端点
+    应按 id 重新加载 ORM 对象。同时写入 request.state.user，
+    访问日志据此记录 user 字段。
+    
     Args:
+        request: 当前请求
         db: 数据库会话
         token: JWT Token
     
     Returns:
-        User: 当前用户对象
+        Principal: 当前用户
     
     Raises:
         HTTPException: Token 无效或用户不存在
@@ -42,16 +49,26 @@ async def get_current_user(
     if username is None:
         raise credentials_exception
     
-    user = await user_crud.get_by_username(db, username)
-    if user is None:
-        raise credentials_exception
+    # 优先使用进程内缓存，命中时不访问数据库
+    cache_key = (username, payload.get("iat"))
+    principal = principal_cache.get(cache_key)
+    if principal is None:
+        # 从主库加载：缓存刚被失效（禁用、改权限）时，延迟的副本可能仍返回旧数据，
+        # 写回缓存后会在整个 TTL 内生效
+        use_primary(db)
+        user = await user_crud.get_by_username(db, username)
+        if user is None:
+            raise credentials_exception
+        principal = Principal.model_validate(user)
+        principal_cache.set(cache_key, principal)
     
-    return user
+    request.state.user = principal
+    return principal
 
 
 async def get_current_active_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     """
     获取当前活跃用户
     
@@ -59,7 +76,7 @@ async def get_current_active_user(
         current_user: 当前用户
     
     Returns:
-        User: 活跃用户对象
+        Principal: 活跃用户
     
     Raises:
         HTTPException: 用户未激活
@@ -73,8 +90,8 @@ async def get_current_active_user(
 
 
 async def get_current_superuser(
-    current_user: User = Depends(get_current_active_user)
-) -> User:
+    current_user: Principal = Depends(get_current_active_user)
+) -> Principal:
     """
     获取当前超级管理员用户
     
@@ -82,7 +99,7 @@ async def get_current_superuser(
         current_user: 当前活跃用户
     
     Returns:
-        User: 超级管理员用户对象
+        Principal: 超级管理员用户
     
     Raises:
         HTTPException: 用户不是超级管理员
@@ -0,0 +1,152 @@
+"""
+OpenAPI 文档路由
+/openapi.json 只生成一次，之后直接返回缓存的（预压缩）字节；
+配置了 OPENAPI_FILE 时直接发送部署时预先生成的文件
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+
+from app.api.conditional import etag_matches
+from app.core.compression import (
+    MAX_LEVELS,
+    SUPPORTED_ENCODINGS,
+    PrecompressedBody,
+    compress,
+    configured_encodings,
+    select_encoding,
+)
+from app.core.logging_config import logger
+
+# 预压缩文件的后缀
+ENCODING_SUFFIXES = {"gzip": ".gz", "br": ".br", "zstd": ".zst"}
+
+# 编码 -> (文件路径, stat 结果)，None 表示未压缩的文件
+PrebuiltFiles = Dict[Optional[str], Tuple[Path, os.stat_result]]
+
+
+def render_openapi(app: FastAPI) -> bytes:
+    """生成 OpenAPI 文档（与 FastAPI 默认的 JSONResponse 输出一致）"""
+    return json.dumps(app.openapi(), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def write_openapi_files(app: FastAPI, path: Path) -> List[Path]:
+    """
+    生成 OpenAPI 文档及其各编码的预压缩文件（部署时调用）
+
+    Args:
+        app: FastAPI 应用
+        path: 输出路径，压缩文件写在同目录下（openapi.json.gz 等）
+
+    Returns:
+        list: 写入的文件
+    """
+    data = render_openapi(app)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    outputs = [(path, data)] + [
+        (path.with_name(path.name + ENCODING_SUFFIXES[encoding]), compress(data, encoding, MAX_LEVELS[encoding]))
+        for encoding in SUPPORTED_ENCODINGS
+    ]
+    for target, content in outputs:
+        tmp = target.with_name(f".{target.name}.tmp")
+        tmp.write_bytes(content)
+        os.replace(tmp, target)
+    # 删除本次构建不支持的编码留下的旧文件，避免发送过期内容
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        if encoding not in SUPPORTED_ENCODINGS:
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
+    return [target for target, _ in outputs]
+
+
+class CachedOpenAPI:
+    """
+    缓存的 OpenAPI 文档
+
+    FastAPI 默认在每个 worker 首次请求时生成 schema，且每次请求都重新序列化为 JSON。
+    prebuilt 指向的文件存在时直接以 FileResponse 发送（按 Accept-Encoding 选择预压缩文件）；
+    否则在首次请求时序列化一次，各编码的压缩结果也只计算一次。
+    """
+
+    def __init__(self, app: FastAPI, prebuilt: str = ""):
+        self.app = app
+        self.prebuilt = prebuilt
+        self._body: Optional[PrecompressedBody] = None
+        self._files: Optional[PrebuiltFiles] = None
+        self._files_checked = False
+
+    def body(self) -> PrecompressedBody:
+        if self._body is None:
+            self._body = PrecompressedBody(render_openapi(self.app), "application/json")
+        return self._body
+
+    def prebuilt_files(self) -> Optional[PrebuiltFiles]:
+        """首次调用时查找预生成的文件，文件不存在时返回 None"""
+        if not self._files_checked:
+            self._files_checked = True
+            if self.prebuilt:
+                path = Path(self.prebuilt)
+                if path.is_file():
+                    files: PrebuiltFiles = {None: (path, path.stat())}
+                    for encoding, suffix in ENCODING_SUFFIXES.items():
+                        variant = path.with_name(path.name + suffix)
+                        if variant.is_file():
+                            files[encoding] = (variant, variant.stat())
+                    self._files = files
+                else:
+                    logger.warning(f"OPENAPI_FILE 不存在，改为运行时生成: {path}")
+        return self._files
+
+    async def endpoint(self, request: Request) -> Response:
+        files = self.prebuilt_files()
+        if files is not None:
+            return self._file_response(request, files)
+
+        body = self.body()
+        encoding = select_encoding(request.headers.get("accept-encoding", ""), configured_encodings())
+        etag = body.variant_etag(encoding)
+        headers = {"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(body.variant(encoding), media_type=body.media_type, headers=headers)
+
+    def _file_response(self, request: Request, files: PrebuiltFiles) -> Response:
+        encodings = [encoding for encoding in configured_encodings() if encoding in files]
+        encoding = select_encoding(request.headers.get("accept-encoding", ""), encodings)
+        path, stat_result = files[encoding]
+        headers = {"Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        response = FileResponse(path, media_type="application/json", headers=headers, stat_result=stat_result)
+        etag = response.headers["etag"]
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(
+                status_code=304,
+                headers={"ETag": etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"},
+            )
+        return response
+
+
+def install_cached_openapi(app: FastAPI, prebuilt: str = "") -> CachedOpenAPI:
+    """
+    用缓存版本替换 FastAPI 自带的 openapi_url 路由（/docs、/redoc 不受影响）
+
+    Args:
+        app: FastAPI 应用（openapi_url 不为空）
+        prebuilt: 预生成的 openapi.json 路径，为空或文件不存在时运行时生成
+
+    Returns:
+        CachedOpenAPI: 缓存对象
+    """
+    cached = CachedOpenAPI(app, prebuilt)
+    app.router.routes[:] = [
+        route for route in app.router.routes if getattr(route, "path", None) != app.openapi_url
+    ]
+    app.add_route(app.openapi_url, cached.endpoint, include_in_schema=False)
+    return cached
@@ -0,0 +1,47 @@
+"""
+分页工具
+不透明的 keyset 分页游标编码/解码
+"""
+import base64
+import binascii
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    将上一页最后一条记录的 ID 编码为不透明游标
+
+    Args:
+        last_id: 上一页最后一条记录的 ID
+
+    Returns:
+        str: URL 安全的游标字符串
+    """
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    解码分页游标
+
+    Args:
+        cursor: 游标字符串
+
+    Returns:
+        int: 游标对应的记录 ID
+
+    Raises:
+        HTTPException: 游标格式无效
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, _, value = raw.partition(":")
+        if prefix != "id":
+            raise ValueError(raw)
+        return int(value)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="无效的分页游标"
+        )
@@ -0,0 +1,108 @@
+"""
+快速 JSON 响应
+基于 orjson（可选依赖）的响应类，以及直接把 ORM 用户对象序列化为 JSON 的响应
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+
+from starlette.background import BackgroundTask
+from starlette.responses import JSONResponse, Response
+
+from app.core.config import settings
+from app.models.user import User
+from app.schemas.user import UserResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        # 与 Pydantic 的输出一致：UTC 时间以 Z 结尾
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    序列化为紧凑的 UTF-8 JSON
+
+    安装了 orjson 时使用 orjson，否则使用标准库 json，两者输出一致。
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+    return json.dumps(
+        content, ensure_ascii=False, separators=(",", ":"), default=_default,
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """使用 orjson 序列化的 JSONResponse（未安装 orjson 时回退到标准库）"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# UserResponse 的字段，直接从 schema 读取，新增字段时无需修改这里
+USER_RESPONSE_FIELDS = tuple(UserResponse.model_fields)
+
+
+def user_to_dict(user: User) -> Dict[str, Any]:
+    """按 UserResponse 的字段从 ORM 对象取值（不做校验）"""
+    return {name: getattr(user, name) for name in USER_RESPONSE_FIELDS}
+
+
+class UserJSONResponse(Response):
+    """
+    直接序列化 ORM 用户对象的响应
+
+    数据来自本服务的 ORM 对象，类型已由数据库列保证，
+    因此跳过 response_model 的校验和中间字典，直接生成 JSON 字节。
+    输出与 UserResponse 经 FastAPI 序列化的结果一致。
+    """
+
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        users: Union[User, List[User]],
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+        background: Optional[BackgroundTask] = None,
+    ):
+        if isinstance(users, list):
+            content = [user_to_dict(user) for user in users]
+        else:
+            content = user_to_dict(users)
+        super().__init__(dumps(content), status_code, headers, background=background)
+
+
+def user_response(
+    users: Union[User, List[User]],
+    response: Optional[Response] = None,
+    status_code: int = 200,
+) -> Any:
+    """
+    用户端点的返回值
+
+    FAST_USER_RESPONSES 开启时返回 UserJSONResponse，否则原样返回 ORM 对象，
+    交给 response_model 校验和序列化。
+
+    Args:
+        users: 单个用户或用户列表
+        response: 端点注入的 Response，其上设置的响应头会一并带上
+        status_code: 状态码
+
+    Returns:
+        UserJSONResponse 或原 ORM 对象
+    """
+    if not settings.FAST_USER_RESPONSES:
+        return users
+    result = UserJSONResponse(users, status_code=status_code)
+    if response is not None:
+        result.headers.raw.extend(response.headers.raw)
+    return result
@@ -2,21 +2,32 @@
 认证相关 API 端点
 处理用户登录、注册等认证操作
 """
+import math
 from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.deps import get_current_user
 from app.core.database import get_db
 from app.core.config import settings
-from app.core.security import create_access_token
-from app.crud.user import user_crud
-from app.schemas.user import UserCreate, UserResponse
+from app.api.responses import user_response
+from app.core.rate_limit import RateLimitExceeded, login_rate_limiter
+from app.core.security import create_access_token, oauth2_scheme, revoke_access_token
+from app.crud.user import user_crud, UserConflictError
+from app.middleware.logging import APIAccessLogger
+from app.schemas.user import Principal, UserCreate, UserResponse
 # from app.schemas import UserCreate, UserResponse  # 使用聚合导入
 from app.schemas.token import Token
 
 router = APIRouter()
 
+# 注册时唯一字段冲突的提示
+REGISTER_CONFLICT_DETAILS = {
+    "email": "该邮箱已被注册",
+    "username": "该用户名已被使用",
+}
+
 
 @router.post(
     "/register",
@@ -37,34 +48,62 @@ async def register(
     - **password**: 密码，8-100字符
     - **full_name**: 可选，用户全名
     """
-    # 检查邮箱是否已存在
-    existing_user = await user_crud.get_by_email(db, user_in.email)
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="该邮箱已被注册"
-        )
+    # 一次查询同时检查邮箱和用户名，避免对重复账户白白计算 bcrypt
+    conflict = await user_crud.find_conflict(db, user_in.email, user_in.username)
+    
+    # 并发注册由数据库唯一约束兜底
+    if conflict is None:
+        try:
+            user = await user_crud.create(db, user_in)
+            return user_response(user, status_code=status.HTTP_201_CREATED)
+        except UserConflictError as exc:
+            conflict = exc.field
+    
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=REGISTER_CONFLICT_DETAILS[conflict]
+    )
+
+
+async def _enforce_login_rate_limit(client_ip: str, username: str) -> None:
+    """
+    登录限流检查（在查询数据库和验证密码之前调用）
     
-    # 检查用户名是否已存在
-    existing_user = await user_crud.get_by_username(db, user_in.username)
-    if existing_user:
+    Raises:
+        HTTPException: 超出限制（429）
+    """
+    if login_rate_limiter is None:
+        return
+    try:
+        await login_rate_limiter.check(client_ip, username)
+    except RateLimitExceeded as exc:
+        if login_rate_limiter.should_report(client_ip, username):
+            APIAccessLogger.log_security_event(
+                "LOGIN_FAILED",
+                "MEDIUM",
+                {
+                    "reason": "rate_limited",
+                    "limit": exc.limit,
+                    "client_ip": client_ip,
+                    "username": username[:128],
+                    "retry_after": round(exc.retry_after, 1),
+                },
+            )
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="该用户名已被使用"
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="登录尝试过于频繁，请稍后再试",
+            headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
         )
-    
-    # 创建用户
-    user = await user_crud.create(db, user_in)
-    return user
 
 
 @router.post(
     "/login",
     response_model=Token,
     summary="用户登录",
-    description="使用用户名或邮箱登录，获取 JWT Access Token。"
+    description="使用用户名或邮箱登录，获取 JWT Access Token。同一 IP 或同一账户尝试过于频繁时返回 429。"
 )
 async def login(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Token:
@@ -77,9 +116,17 @@ async def login(
     
     返回 JWT Access Token，用于后续 API 调用认证。
     """
+    client_ip = request.client.host if request.client else "unknown"
+    await _enforce_login_rate_limit(client_ip, form_data.username)
+    
     user = await user_crud.authenticate(db, form_data.username, form_data.password)
     
     if not user:
+        APIAccessLogger.log_security_event(
+            "LOGIN_FAILED",
+            "LOW",
+            {"reason": "invalid_credentials", "client_ip": client_ip, "username": form_data.username[:128]},
+        )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
@@ -100,3 +147,27 @@ async def login(
     )
     
     return Token(access_token=access_token, token_type="bearer")
+
+
+@router.post(
+    "/logout",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="退出登录",
+    description="吊销当前使用的 Access Token，之后该 Token 在所有 worker 上都无法再使用。吊销列表已满时返回 503。",
+)
+async def logout(
+    token: str = Depends(oauth2_scheme),
+    current_user: Principal = Depends(get_current_user)
+) -> Response:
+    """
+    退出登录
+    
+    吊销请求头中的 Token（保留到 Token 过期为止），客户端应同时丢弃本地保存的 Token。
+    """
+    if not revoke_access_token(token):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="服务繁忙，请稍后重试",
+            headers={"Retry-After": "60"},
+        )
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
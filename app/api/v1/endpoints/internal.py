@@ -0,0 +1,95 @@
+"""
+内部监控 API 端点
+提供当前 worker 的运行状态，用于容量规划和排障
+"""
+from fastapi import APIRouter, Depends, Query
+
+from app.api.deps import get_current_superuser
+from app.core.database import engine, replica_engines, replica_pool_metrics
+from app.core.db_metrics import pool_metrics
+from app.core.logging_config import get_sink_stats
+from app.core.sql_profiler import profile_history
+from app.core.stack_sampler import stack_sampler
+from app.middleware import access_log_stats
+from app.schemas.user import Principal
+
+router = APIRouter()
+
+
+@router.get(
+    "/db-pool",
+    summary="数据库连接池统计",
+    description="返回处理本次请求的 worker 的连接池配置、占用情况和等待时间直方图（需要超级管理员权限）。"
+)
+async def get_db_pool_stats(
+    current_user: Principal = Depends(get_current_superuser)
+) -> dict:
+    """
+    数据库连接池统计（管理员）
+    
+    统计按 worker 进程独立计算，多次请求可能落到不同 worker（见 pid 字段）。
+    顶层为主库统计，配置了只读副本时每个副本的统计在 replicas 中。
+    """
+    data = pool_metrics.snapshot(engine)
+    data["replicas"] = [
+        metrics.snapshot(replica) for replica, metrics in zip(replica_engines, replica_pool_metrics)
+    ]
+    return data
+
+
+@router.get(
+    "/logging",
+    summary="日志队列统计",
+    description="返回处理本次请求的 worker 的后台日志队列长度、写入数和丢弃数（需要超级管理员权限，未开启 LOG_ASYNC 时为空）。"
+)
+async def get_logging_stats(
+    current_user: Principal = Depends(get_current_superuser)
+) -> dict:
+    """
+    后台日志 sink 统计（管理员）
+    """
+    return get_sink_stats()
+
+
+@router.get(
+    "/access-log",
+    summary="访问日志采样统计",
+    description="返回处理本次请求的 worker 的请求计数，包括被采样跳过、未写入日志的请求（需要超级管理员权限）。"
+)
+async def get_access_log_stats(
+    current_user: Principal = Depends(get_current_superuser)
+) -> dict:
+    """
+    访问日志计数（管理员）
+    """
+    return access_log_stats.snapshot()
+
+
+@router.get(
+    "/sql-profiles",
+    summary="最近请求的 SQL 分析结果",
+    description="返回处理本次请求的 worker 最近请求的语句数、数据库耗时和重复语句（需要开启 SQL_PROFILER_ENABLED 和超级管理员权限）。"
+)
+async def get_sql_profiles(
+    limit: int = Query(50, ge=1, le=1000, description="最多返回的请求数"),
+    only_violations: bool = Query(False, description="只返回超出预算的请求"),
+    current_user: Principal = Depends(get_current_superuser)
+) -> list:
+    """
+    SQL 分析结果（管理员）
+    """
+    return profile_history.recent(limit=limit, only_violations=only_violations)
+
+
+@router.get(
+    "/stack-profiler",
+    summary="慢请求采样统计",
+    description="返回处理本次请求的 worker 的采样配置、进行中的请求数和已保存的采样文件数（需要超级管理员权限）。"
+)
+async def get_stack_profiler_stats(
+    current_user: Principal = Depends(get_current_superuser)
+) -> dict:
+    """
+    慢请求采样统计（管理员）
+    """
+    return stack_sampler.stats()
@@ -2,34 +2,102 @@
 用户管理 API 端点
 处理用户 CRUD 操作
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, async_session_maker
 from app.api.deps import get_current_active_user, get_current_superuser
-from app.crud.user import user_crud
+from app.api.conditional import CACHE_CONTROL, etag_matches, not_modified, page_etag, user_etag, users_etag
+from app.api.pagination import encode_cursor, decode_cursor
+from app.api.responses import user_response
+from app.crud.user import user_crud, EXPORT_COLUMNS, UserConflictError
 from app.models.user import User
-from app.schemas.user import UserResponse, UserUpdate
+from app.schemas.user import Principal, UserCreate, UserResponse, UserUpdate, UserImportError, UserImportResult
 
 router = APIRouter()
 
+# 更新时唯一字段冲突的提示
+UPDATE_CONFLICT_DETAILS = {
+    "email": "该邮箱已被其他用户使用",
+    "username": "该用户名已被其他用户使用",
+}
+
+
+async def _update_user(db: AsyncSession, db_user: User, user_in: UserUpdate) -> User:
+    """
+    检查唯一字段后更新用户
+    
+    只检查实际发生变化的邮箱/用户名，合并为一次查询；
+    检查之后的并发冲突由数据库唯一约束兜底。
+    
+    Raises:
+        HTTPException: 邮箱或用户名已被其他用户使用
+    """
+    email = user_in.email if user_in.email and user_in.email != db_user.email else None
+    username = user_in.username if user_in.username and user_in.username != db_user.username else None
+    
+    conflict = await user_crud.find_conflict(db, email, username, exclude_id=db_user.id)
+    if conflict is None:
+        try:
+            return await user_crud.update(db, db_user, user_in)
+        except UserConflictError as exc:
+            conflict = exc.field
+    
+    raise HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=UPDATE_CONFLICT_DETAILS[conflict]
+    )
+
+
+def _conditional_user_response(request: Request, response: Response, user: Union[User, Principal]):
+    """
+    返回单个用户，带弱 ETag
+    
+    If-None-Match 命中时直接返回 304，不再序列化用户。
+    """
+    etag = user_etag(user)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return user_response(user, response)
+
+
+def _list_headers(total: int, count: int, limit: int, last_id: Optional[int]) -> dict:
+    """用户列表的分页响应头"""
+    headers = {"X-Total-Count": str(total)}
+    if count == limit and last_id is not None:
+        headers["X-Next-Cursor"] = encode_cursor(last_id)
+    return headers
+
 
 @router.get(
     "/me",
     response_model=UserResponse,
     summary="获取当前用户信息",
-    description="获取当前登录用户的详细信息。"
+    description="获取当前登录用户的详细信息。支持 If-None-Match，未变化时返回 304。",
+    responses={304: {"description": "用户信息未变化"}},
 )
 async def get_current_user_info(
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_active_user)
 ) -> UserResponse:
     """
     获取当前用户信息
     
     需要认证。返回当前登录用户的详细信息。
+    响应头 `ETag` 由用户 ID 和更新时间生成，请求头 `If-None-Match` 与之相同时返回 304。
     """
-    return current_user
+    return _conditional_user_response(request, response, current_user)
 
 
 @router.put(
@@ -41,7 +109,7 @@ async def get_current_user_info(
 async def update_current_user(
     user_in: UserUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    current_user: Principal = Depends(get_current_active_user)
 ) -> UserResponse:
     """
     更新当前用户信息
@@ -52,63 +120,241 @@ async def update_current_user(
     - **full_name**: 全名
     - **password**: 密码
     """
-    # 检查邮箱是否被其他用户使用
-    if user_in.email and user_in.email != current_user.email:
-        existing = await user_crud.get_by_email(db, user_in.email)
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="该邮箱已被其他用户使用"
-            )
-    
-    # 检查用户名是否被其他用户使用
-    if user_in.username and user_in.username != current_user.username:
-        existing = await user_crud.get_by_username(db, user_in.username)
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="该用户名已被其他用户使用"
-            )
-    
     # 普通用户不能更改 is_active 状态
     if user_in.is_active is not None and not current_user.is_superuser:
         user_in.is_active = None
     
-    user = await user_crud.update(db, current_user, user_in)
-    return user
+    # current_user 是只读快照，修改前在本次会话中加载用户
+    db_user = await user_crud.get_by_id(db, current_user.id)
+    if db_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="用户不存在"
+        )
+    return user_response(await _update_user(db, db_user, user_in))
 
 
 @router.get(
     "",
     response_model=List[UserResponse],
     summary="获取用户列表",
-    description="获取所有用户列表（需要超级管理员权限）。支持分页。"
+    description="获取所有用户列表（需要超级管理员权限）。支持 offset 分页和游标分页，以及 If-None-Match 条件请求。",
+    responses={304: {"description": "该页用户未变化"}},
 )
 async def get_users(
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0, description="跳过的记录数"),
     limit: int = Query(100, ge=1, le=100, description="返回的最大记录数"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页响应头 X-Next-Cursor 的值），传入时忽略 skip"),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_superuser)
+    current_user: Principal = Depends(get_current_superuser)
 ) -> List[UserResponse]:
     """
     获取用户列表（管理员）
     
-    需要超级管理员权限。支持分页查询。
+    需要超级管理员权限。支持两种分页方式：
+    - **skip/limit**: offset 分页（兼容旧客户端）
+    - **cursor/limit**: 游标分页，深度翻页时耗时恒定，适合全量导出
+    
+    还有下一页时响应头 `X-Next-Cursor` 给出下一页的游标；
+    响应头 `X-Total-Count` 给出用户总数（缓存值，可能有数秒延迟）。
+    
+    响应头 `ETag` 由该页的记录数、ID 和最大更新时间生成；请求头 `If-None-Match`
+    与之相同时只在数据库中聚合计算 ETag，不加载用户，直接返回 304。
+    """
+    after_id = decode_cursor(cursor) if cursor else None
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        count, max_id, id_sum, max_updated_at = await user_crud.get_page_fingerprint(
+            db, skip=skip, limit=limit, after_id=after_id
+        )
+        etag = page_etag(count, max_id, id_sum, max_updated_at)
+        if etag_matches(if_none_match, etag):
+            total = await user_crud.get_cached_count(db)
+            return not_modified(etag, _list_headers(total, count, limit, max_id))
+    
+    users = await user_crud.get_list(db, skip=skip, limit=limit, after_id=after_id)
+    total = await user_crud.get_cached_count(db)
+    response.headers.update(_list_headers(total, len(users), limit, users[-1].id if users else None))
+    response.headers["ETag"] = users_etag(users)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return user_response(users, response)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+async def _export_chunks(export_format: str) -> AsyncIterator[bytes]:
+    """
+    逐块生成导出内容
+    
+    流式响应在依赖清理之后才开始发送，因此这里自行打开数据库会话。
+    """
+    columns = [column.key for column in EXPORT_COLUMNS]
+    
+    if export_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield buffer.getvalue().encode("utf-8")
+    
+    async with async_session_maker() as db:
+        async for rows in user_crud.iter_export_rows(db):
+            if export_format == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(
+                    [value.isoformat() if isinstance(value, datetime) else value for value in row]
+                    for row in rows
+                )
+                yield buffer.getvalue().encode("utf-8")
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(columns, row)), ensure_ascii=False, default=_json_default) + "\n"
+                    for row in rows
+                ).encode("utf-8")
+
+
+@router.get(
+    "/export",
+    summary="导出全部用户",
+    description="以 NDJSON 或 CSV 格式流式导出全部用户（需要超级管理员权限）。",
+    response_class=StreamingResponse,
+)
+async def export_users(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$", description="导出格式：ndjson 或 csv"),
+    current_user: Principal = Depends(get_current_superuser)
+) -> StreamingResponse:
+    """
+    导出全部用户（管理员）
+    
+    需要超级管理员权限。数据通过服务端游标分块读取并边读边发送，
+    内存占用恒定，适合导出大量用户。
     """
-    users = await user_crud.get_list(db, skip=skip, limit=limit)
-    return users
+    if export_format == "csv":
+        media_type = "text/csv; charset=utf-8"
+    else:
+        media_type = "application/x-ndjson"
+    return StreamingResponse(
+        _export_chunks(export_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{export_format}"'},
+    )
+
+
+def _parse_import_body(body: bytes, content_type: str) -> List[tuple]:
+    """
+    解析导入请求体为 (行号, 原始数据或错误信息) 列表
+    
+    支持 JSON 数组和 NDJSON（每行一个 JSON 对象）。
+    """
+    if "ndjson" in content_type:
+        items = []
+        for row, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append((row, json.loads(line)))
+            except ValueError:
+                items.append((row, UserImportError(row=row, detail="不是有效的 JSON")))
+        return items
+    
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请求体不是有效的 JSON"
+        )
+    if not isinstance(data, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="请求体必须是用户对象数组"
+        )
+    return list(enumerate(data, start=1))
+
+
+@router.post(
+    "/import",
+    response_model=UserImportResult,
+    summary="批量导入用户",
+    description="以 JSON 数组或 NDJSON 批量创建用户（需要超级管理员权限），返回逐行错误报告。",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/UserCreate"}}
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def import_users(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_superuser)
+) -> UserImportResult:
+    """
+    批量导入用户（管理员）
+    
+    需要超级管理员权限。每行字段与注册接口相同；
+    格式错误、邮箱或用户名重复的行会出现在 errors 中，其余行正常创建。
+    所有行在同一个事务中提交：请求中途失败时不会留下部分导入的用户。
+    """
+    items = _parse_import_body(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > settings.USER_IMPORT_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"单次最多导入 {settings.USER_IMPORT_MAX_ROWS} 个用户"
+        )
+    
+    errors: List[UserImportError] = []
+    valid_rows = []
+    for row, item in items:
+        if isinstance(item, UserImportError):
+            errors.append(item)
+            continue
+        try:
+            valid_rows.append((row, UserCreate.model_validate(item)))
+        except ValidationError as exc:
+            first = exc.errors()[0]
+            errors.append(UserImportError(
+                row=row,
+                field=".".join(str(part) for part in first["loc"]) or None,
+                detail=first["msg"],
+            ))
+    
+    created, conflicts = await user_crud.bulk_create(
+        db, valid_rows, batch_size=settings.USER_IMPORT_BATCH_SIZE
+    )
+    errors = sorted(errors + conflicts, key=lambda error: error.row)
+    return UserImportResult(
+        total=len(items),
+        created=created,
+        failed=len(errors),
+        errors=errors,
+    )
 
 
 @router.get(
     "/{user_id}",
     response_model=UserResponse,
     summary="获取指定用户信息",
-    description="根据用户 ID 获取用户信息（需要超级管理员权限）。"
+    description="根据用户 ID 获取用户信息（需要超级管理员权限）。支持 If-None-Match，未变化时返回 304。",
+    responses={304: {"description": "用户信息未变化"}},
 )
 async def get_user_by_id(
     user_id: int,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_superuser)
+    current_user: Principal = Depends(get_current_superuser)
 ) -> UserResponse:
     """
     获取指定用户信息（管理员）
@@ -121,7 +367,7 @@ async def get_user_by_id(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="用户不存在"
         )
-    return user
+    return _conditional_user_response(request, response, user)
 
 
 @router.put(
@@ -134,7 +380,7 @@ async def update_user(
     user_id: int,
     user_in: UserUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_superuser)
+    current_user: Principal = Depends(get_current_superuser)
 ) -> UserResponse:
     """
     更新指定用户信息（管理员）
@@ -148,26 +394,7 @@ async def update_user(
             detail="用户不存在"
         )
     
-    # 检查邮箱是否被其他用户使用
-    if user_in.email and user_in.email != db_user.email:
-        existing = await user_crud.get_by_email(db, user_in.email)
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="该邮箱已被其他用户使用"
-            )
-    
-    # 检查用户名是否被其他用户使用
-    if user_in.username and user_in.username != db_user.username:
-        existing = await user_crud.get_by_username(db, user_in.username)
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="该用户名已被其他用户使用"
-            )
-    
-    user = await user_crud.update(db, db_user, user_in)
-    return user
+    return user_response(await _update_user(db, db_user, user_in))
 
 
 @router.delete(
@@ -179,7 +406,7 @@ async def update_user(
 async def delete_user(
     user_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_superuser)
+    current_user: Principal = Depends(get_current_superuser)
 ):
     """
     删除用户（管理员）
@@ -3,7 +3,7 @@ API v1 路由聚合
 """
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import auth, users
+from app.api.v1.endpoints import auth, users, internal
 
 # 创建 v1 路由器
 api_router = APIRouter()
@@ -20,3 +20,9 @@ api_router.include_router(
     prefix="/users", 
     tags=["👤 用户管理"]
 )
+
+api_router.include_router(
+    internal.router, 
+    prefix="/internal", 
+    tags=["🔧 内部监控"]
+)
@@ -0,0 +1,292 @@
+"""
+进程内缓存模块
+提供带 TTL 的 LRU 缓存以及认证用户（principal）缓存
+"""
+import asyncio
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import cache_entries, cache_hits_total, cache_misses_total
+
+
+class TTLCache:
+    """
+    TTL + LRU 缓存
+
+    - 超过 maxsize 时淘汰最久未使用的条目
+    - 条目过期后在读取时惰性删除
+    - 记录命中/未命中次数
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+            default: 未命中时的返回值
+
+        Returns:
+            缓存值或 default
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            expires_at: 过期时间（time.monotonic() 时间基准），默认 now + ttl
+        """
+        if not self.enabled:
+            return
+        if expires_at is None:
+            expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+            self._data[key] = (expires_at, value)
+            self._on_set(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key: Hashable) -> Any:
+        """删除并返回缓存条目"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            self._remove(key)
+            return item[1]
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            for key in list(self._data):
+                self._remove(key)
+
+    def _on_set(self, key: Hashable) -> None:
+        """写入钩子（子类维护二级索引用，调用时已持有锁）"""
+
+    def _remove(self, key: Hashable) -> None:
+        """删除条目（所有淘汰路径都经过这里，调用时已持有锁）"""
+        del self._data[key]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def export_metrics(self, name: str) -> None:
+        """
+        把命中/未命中次数与条目数导出到指标注册表
+
+        Args:
+            name: 指标中 cache 标签的值
+        """
+        cache_hits_total.set_function(lambda: self.hits, (name,))
+        cache_misses_total.set_function(lambda: self.misses, (name,))
+        cache_entries.set_function(lambda: len(self), (name,))
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计信息"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class PrincipalCache(TTLCache):
+    """
+    认证用户缓存
+
+    以 (sub, iat) 为键缓存只读的 Principal（不含密码哈希），并按用户名维护索引，
+    用户被更新/删除时可以一次性失效该用户的所有条目。
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize, ttl)
+        self._keys_by_username: Dict[str, Set[Hashable]] = {}
+
+    def _on_set(self, key: Hashable) -> None:
+        self._keys_by_username.setdefault(key[0], set()).add(key)
+
+    def _remove(self, key: Hashable) -> None:
+        super()._remove(key)
+        keys = self._keys_by_username.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_username[key[0]]
+
+    def invalidate(self, username: str) -> None:
+        """
+        失效指定用户的所有缓存条目
+
+        Args:
+            username: 用户名（JWT 中的 sub）
+        """
+        with self._lock:
+            for key in list(self._keys_by_username.get(username, ())):
+                self._remove(key)
+
+
+class ExpiringSet:
+    """
+    带过期时间的集合（不做 LRU 淘汰）
+
+    条目只在到期后删除；已满时（清理到期条目后仍满）拒绝新条目，
+    不会为腾出空间提前删除未到期的条目。
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._expires: Dict[Hashable, float] = {}
+        self._heap: List[Tuple[float, Hashable]] = []
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def add(self, key: Hashable, expires_at: float) -> bool:
+        """
+        加入条目（已存在时延长到较晚的到期时间）
+
+        Args:
+            key: 条目
+            expires_at: 到期时间（time.monotonic() 时间基准）
+
+        Returns:
+            bool: 是否已加入，集合已满时为 False
+        """
+        with self._lock:
+            self._purge()
+            current = self._expires.get(key)
+            if current is None and len(self._expires) >= self.maxsize:
+                self.rejected += 1
+                return False
+            if current is None or expires_at > current:
+                self._expires[key] = expires_at
+                heapq.heappush(self._heap, (expires_at, key))
+            return True
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            expires_at = self._expires.get(key)
+            return expires_at is not None and expires_at > time.monotonic()
+
+    def _purge(self) -> None:
+        """删除所有已到期的条目（调用时已持有锁）"""
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            if self._expires.get(key) == expires_at:
+                del self._expires[key]
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+
+class CachedCount:
+    """
+    带过期上限的计数缓存
+
+    本进程的写操作在事务提交后通过 adjust() 增量维护计数；
+    其他 worker 的写操作在最多 max_staleness 秒后通过重新计数体现。
+    max_staleness 为 0 时每次都重新计数。
+    """
+
+    def __init__(self, max_staleness: float):
+        self.max_staleness = max_staleness
+        self._value: Optional[int] = None
+        self._fetched_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._value is not None
+            and time.monotonic() - self._fetched_at < self.max_staleness
+        )
+
+    async def get(self, loader: Callable[[], Awaitable[int]]) -> int:
+        """
+        获取计数，过期时调用 loader 重新计数（并发请求只计数一次）
+
+        Args:
+            loader: 执行真实计数的协程函数
+
+        Returns:
+            int: 计数值
+        """
+        if self._is_fresh():
+            return self._value
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self._is_fresh():
+                value = await loader()
+                self._value = value
+                self._fetched_at = time.monotonic()
+            return self._value
+
+    def adjust(self, delta: int) -> None:
+        """按增量修正计数（在事务提交后调用）"""
+        if self._value is not None:
+            self._value += delta
+
+    def invalidate(self) -> None:
+        """丢弃缓存的计数"""
+        self._value = None
+
+
+# 全局认证用户缓存
+principal_cache = PrincipalCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+)
+principal_cache.export_metrics("principal")
+
+# 用户总数缓存
+user_count = CachedCount(max_staleness=settings.USER_COUNT_MAX_STALENESS)
+
+
+def _handle_invalidation(message: str) -> None:
+    """处理失效通知：user:<username>"""
+    kind, _, key = message.partition(":")
+    if kind == "user":
+        principal_cache.invalidate(key)
+
+
+invalidation_bus.subscribe(_handle_invalidation, on_reset=principal_cache.clear)
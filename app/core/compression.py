@@ -0,0 +1,174 @@
+"""
+响应压缩模块
+gzip 始终可用，安装了 brotli / zstandard 时同时支持 br / zstd；
+提供 Accept-Encoding 协商、流式压缩器和预压缩的缓存响应体
+"""
+import hashlib
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 本进程支持的编码
+SUPPORTED_ENCODINGS = tuple(
+    name for name, available in (("zstd", zstandard), ("br", brotli), ("gzip", True)) if available
+)
+
+# 预压缩（只压缩一次的内容）使用的最高压缩级别
+MAX_LEVELS = {"gzip": 9, "br": 11, "zstd": 19}
+
+
+def configured_encodings() -> Tuple[str, ...]:
+    """COMPRESSION_ENCODINGS 中本进程支持的编码（按优先级排列）"""
+    return tuple(
+        name for name in (item.strip() for item in settings.COMPRESSION_ENCODINGS.split(","))
+        if name in SUPPORTED_ENCODINGS
+    )
+
+
+def configured_levels() -> Dict[str, int]:
+    """各编码的压缩级别"""
+    return {
+        "gzip": settings.COMPRESSION_GZIP_LEVEL,
+        "br": settings.COMPRESSION_BROTLI_QUALITY,
+        "zstd": settings.COMPRESSION_ZSTD_LEVEL,
+    }
+
+
+def select_encoding(accept_encoding: str, encodings: Iterable[str]) -> Optional[str]:
+    """
+    根据 Accept-Encoding 选择编码
+
+    取 q 值最高的编码，q 值相同时按 encodings 的顺序（服务端优先级）。
+
+    Args:
+        accept_encoding: Accept-Encoding 请求头
+        encodings: 可用编码（按优先级排列）
+
+    Returns:
+        str | None: 选中的编码，客户端不接受任何可用编码时返回 None
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.partition(";")
+        name = name.strip()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            weights[name] = q
+    wildcard = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    for name in encodings:
+        q = weights.get(name, wildcard)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class Compressor:
+    """
+    流式压缩器
+
+    每次 compress 都会 flush，返回的数据可以立即发送给客户端，
+    流式响应的每个分块都能及时到达。
+    """
+
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=level)
+        elif encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            raise ValueError(f"不支持的编码: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "gzip":
+            return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+        if self.encoding == "br":
+            return self._obj.process(data) + self._obj.flush()
+        return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    """
+    一次性压缩完整的响应体
+
+    Args:
+        data: 原始数据
+        encoding: gzip / br / zstd
+        level: 压缩级别
+
+    Returns:
+        bytes: 压缩后的数据
+    """
+    if encoding == "gzip":
+        obj = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return obj.compress(data) + obj.flush()
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"不支持的编码: {encoding}")
+
+
+class PrecompressedBody:
+    """
+    预压缩的缓存响应体
+
+    内容只生成一次，各编码的压缩结果在首次被请求时以最高级别压缩并缓存，
+    之后的请求直接返回缓存的字节。
+    """
+
+    def __init__(self, data: bytes, media_type: str):
+        self.data = data
+        self.media_type = media_type
+        self.etag = '"' + hashlib.blake2b(data, digest_size=8).hexdigest() + '"'
+        self._variants: Dict[str, bytes] = {}
+
+    def variant(self, encoding: Optional[str]) -> bytes:
+        """
+        指定编码的响应体
+
+        Args:
+            encoding: 编码，None 表示不压缩
+
+        Returns:
+            bytes: 响应体
+        """
+        if encoding is None:
+            return self.data
+        body = self._variants.get(encoding)
+        if body is None:
+            body = self._variants[encoding] = compress(self.data, encoding, MAX_LEVELS[encoding])
+        return body
+
+    def variant_etag(self, encoding: Optional[str]) -> str:
+        """各编码的强 ETag 互不相同"""
+        if encoding is None:
+            return self.etag
+        return f'{self.etag[:-1]}-{encoding}"'
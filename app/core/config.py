@@ -2,6 +2,7 @@
 应用配置模块
 使用 Pydantic Settings 从环境变量加载配置
 """
+from typing import List, Literal, Optional, Set
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 
@@ -19,9 +20,123 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # 密码哈希配置（bcrypt 在独立线程池/进程池中执行）
+    PASSWORD_HASH_EXECUTOR: str = "thread"  # thread 或 process
+    PASSWORD_HASH_WORKERS: Optional[int] = None  # 默认为 CPU 核数
+    PASSWORD_HASH_MAX_QUEUE: int = 32  # 超过此排队数直接返回 503
+    PASSWORD_HASH_BULK_SHARE: float = 0.5  # 批量导入最多占用的 worker 比例（至少 1 个），其余留给登录
+    
+    # 已验证 Token 缓存（大小为 0 时关闭）
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_REVOCATION_SIZE: int = 100000  # 吊销列表容量，条目保留到 Token 过期，已满时拒绝新的吊销（503）
+    
+    # 批量导入用户
+    USER_IMPORT_MAX_ROWS: int = 50000
+    USER_IMPORT_BATCH_SIZE: int = 500
+    
+    # 用户端点直接把 ORM 对象序列化为 JSON（跳过 response_model 校验，安装 orjson 时更快）
+    FAST_USER_RESPONSES: bool = True
+    
+    # 认证用户缓存（TTL 为 0 时关闭）
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL: float = 30.0
+    
+    # 登录限流（令牌桶：容量为允许的突发次数，按每分钟速率补充）
+    LOGIN_RATE_LIMIT_ENABLED: bool = True
+    LOGIN_IP_BURST: int = 20
+    LOGIN_IP_PER_MINUTE: float = 10.0
+    LOGIN_USERNAME_BURST: int = 5
+    LOGIN_USERNAME_PER_MINUTE: float = 2.0
+    RATE_LIMIT_BACKEND: Literal["memory", "redis"] = "memory"  # redis：多 worker / 多主机共享限流状态
+    RATE_LIMIT_MAX_KEYS: int = 100000  # memory 后端每个桶表最多保存的键数
+    
+    # 用户总数缓存的最大过期时间（秒），0 表示每次都精确计数
+    USER_COUNT_MAX_STALENESS: float = 10.0
+    
     # 数据库配置
     DATABASE_URL: str = "sqlite+aiosqlite:///./app.db"
     
+    # 只读副本（逗号分隔的连接串，为空时不启用读写分离）
+    DATABASE_REPLICA_URLS: str = ""
+    DB_REPLICA_STRATEGY: Literal["round_robin", "least_connections"] = "round_robin"
+    
+    # 数据库连接池（每个 gunicorn worker 各自一个连接池，
+    # 总连接数上限约为 workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW)）
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # 获取连接的最长等待秒数
+    DB_POOL_RECYCLE: int = 3600  # 连接最长存活秒数，需小于 MySQL wait_timeout
+    DB_POOL_PRE_PING: bool = True  # 取出连接前探活，避免使用已被服务端断开的连接
+    
+    # SQLite 高并发模式（多 worker 写同一个文件时开启：WAL + busy_timeout 等）
+    SQLITE_TUNING: bool = False
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"  # WAL 模式下 NORMAL 可保证一致性，只在掉电时可能丢最后几个事务
+    SQLITE_CACHE_SIZE_KB: int = 65536
+    SQLITE_MMAP_SIZE: int = 268435456
+    
+    # Redis 配置（可选，用于跨 worker 共享状态）
+    REDIS_URL: str = "redis://localhost:6379/0"
+    
+    # 缓存失效通知（local：仅本进程，只适用于单 worker；unix：单机多 worker；redis：跨主机）
+    INVALIDATION_BACKEND: Literal["local", "unix", "redis"] = "unix"
+    INVALIDATION_SOCKET_DIR: str = ""  # unix 后端使用，须为本应用独占的 0700 目录；为空时按用户与应用目录自动生成
+    INVALIDATION_CHANNEL: str = "fastapi:invalidation"
+    
+    # 日志（LOG_ASYNC 开启后文件日志由后台线程写入，请求路径只做入队）
+    LOG_ASYNC: bool = False
+    LOG_QUEUE_SIZE: int = 10000  # 每个文件日志的缓冲队列长度
+    LOG_OVERFLOW_POLICY: Literal["drop", "block"] = "drop"  # 队列满时丢弃（计数）或阻塞等待
+    
+    # 访问日志采样（4xx/5xx 与慢请求始终记录，计数不受采样影响）
+    ACCESS_LOG_SAMPLE_RATE: float = 1.0  # 成功请求的记录比例，0~1
+    ACCESS_LOG_SLOW_THRESHOLD: float = 1.0  # 慢请求阈值（秒）
+    ACCESS_LOG_EXCLUDE_PATHS: str = ""  # 逗号分隔，这些路径的成功请求不记录，例如 /health
+    
+    # 请求 ID（上游 Nginx/网关已生成 X-Request-ID 时沿用，否则由本服务生成）
+    TRUST_REQUEST_ID_HEADER: bool = True
+    
+    # 响应压缩（br / zstd 需要安装 brotli / zstandard，未安装时自动跳过）
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # 小于该字节数的响应不压缩
+    COMPRESSION_ENCODINGS: str = "zstd,br,gzip"  # 逗号分隔，按优先级排列
+    COMPRESSION_GZIP_LEVEL: int = 6  # 1~9
+    COMPRESSION_BROTLI_QUALITY: int = 4  # 0~11，动态响应不宜过高
+    COMPRESSION_ZSTD_LEVEL: int = 3  # 1~22
+    
+    # API 文档（/docs、/redoc、/openapi.json）；生产环境可关闭，或用 build_openapi.py 预先生成文档
+    DOCS_ENABLED: bool = True
+    OPENAPI_FILE: str = ""  # 预生成的 openapi.json 路径，为空或文件不存在时运行时生成
+    
+    # 指标（/metrics，Prometheus 文本格式）
+    METRICS_ENABLED: bool = True
+    METRICS_MULTIPROC_DIR: str = ""  # 多 worker 部署时设置，各 worker 的快照写入此目录并在抓取时汇总
+    METRICS_FLUSH_INTERVAL: float = 5.0  # 快照写入间隔（秒）
+    
+    # SQL 分析器（开启后记录每个请求的语句数、耗时和重复语句，超出预算时告警）
+    SQL_PROFILER_ENABLED: bool = False
+    SQL_PROFILER_HEADER: bool = True  # 在响应头 X-SQL-Profile 中返回摘要
+    SQL_PROFILER_MAX_QUERIES: int = 10  # 单个请求的语句数预算
+    SQL_PROFILER_MAX_DB_MS: float = 100.0  # 单个请求的数据库耗时预算（毫秒）
+    SQL_PROFILER_REPEAT_THRESHOLD: int = 3  # 同一语句执行次数达到该值视为疑似 N+1
+    SQL_PROFILER_HISTORY: int = 200  # 保留最近多少个请求的分析结果
+    
+    # 慢请求采样分析（开启后对进行中的请求定时采集调用栈，慢请求写入 LOG_DIR/profiles）
+    STACK_PROFILER_ENABLED: bool = False
+    STACK_PROFILER_INTERVAL: float = 0.005  # 采样间隔（秒）
+    STACK_PROFILER_THRESHOLD: float = 1.0  # 超过该耗时（秒）的请求保存采样结果
+    STACK_PROFILER_MAX_FILES: int = 100  # 目录中最多保留的采样文件数
+    
+    @property
+    def replica_urls(self) -> List[str]:
+        """只读副本连接串列表"""
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+    
+    @property
+    def access_log_exclude_paths(self) -> Set[str]:
+        """不记录成功请求的路径集合"""
+        return {path.strip() for path in self.ACCESS_LOG_EXCLUDE_PATHS.split(",") if path.strip()}
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
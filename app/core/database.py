@@ -2,22 +2,151 @@
 数据库模块
 配置 SQLAlchemy 异步数据库连接
 """
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+import itertools
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import event, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import QueuePool
 
 from app.core.config import settings
+from app.core.db_metrics import PoolMetrics, TimedAsyncAdaptedQueuePool, pool_metrics
+from app.core.metrics import attach_query_metrics
+from app.core.sql_profiler import attach_sql_profiler
+
+
+def _engine_options(database_url: str) -> Dict[str, Any]:
+    """
+    构造引擎参数
+    
+    内存 SQLite 使用单连接的 StaticPool，不支持连接池参数；
+    其余数据库（文件 SQLite、MySQL、PostgreSQL）使用带计时的队列连接池。
+    """
+    options: Dict[str, Any] = {
+        "echo": settings.DEBUG,  # 调试模式下打印 SQL 语句
+        "future": True,
+    }
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+    options.update(
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    return options
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    为每个新建的 SQLite 连接设置高并发参数
+    
+    - journal_mode=WAL: 读写互不阻塞，多个 worker 可同时读
+    - busy_timeout: 写锁被占用时等待而不是立即报 database is locked
+    - synchronous=NORMAL: WAL 模式下减少 fsync 次数
+    - cache_size/mmap_size/temp_store: 减少磁盘 I/O
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _sqlite_begin_before_savepoint(conn, name) -> None:
+    """
+    SAVEPOINT 之前确保已在事务中
+
+    sqlite3 驱动只在写语句前隐式 BEGIN；事务外执行的 SAVEPOINT 会自行开启事务，
+    RELEASE 时就提前提交。这里在事务外的 SAVEPOINT 之前先显式 BEGIN，
+    savepoint 才会嵌套在由 get_db 提交的事务中。读语句仍在事务外执行，
+    不会因持有旧快照而在随后写入时遇到 database is locked。
+    """
+    if not conn.connection.driver_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN")
+
+
+def _create_engine(database_url: str) -> AsyncEngine:
+    new_engine = create_async_engine(database_url, **_engine_options(database_url))
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine.sync_engine, "savepoint", _sqlite_begin_before_savepoint)
+    if settings.SQLITE_TUNING and new_engine.dialect.name == "sqlite":
+        event.listen(new_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    attach_query_metrics(new_engine)
+    if settings.SQL_PROFILER_ENABLED:
+        attach_sql_profiler(new_engine)
+    return new_engine
+
+
+# 创建异步数据库引擎（主库）
+engine = _create_engine(settings.DATABASE_URL)
+pool_metrics.attach(engine)
+
+# 只读副本引擎（未配置时为空，所有读写都走主库）
+replica_engines: List[AsyncEngine] = [_create_engine(url) for url in settings.replica_urls]
+
+# 每个只读副本单独统计连接池，不与主库混在一起
+replica_pool_metrics: List[PoolMetrics] = [
+    PoolMetrics(f"replica-{index}") for index in range(1, len(replica_engines) + 1)
+]
+for _replica, _metrics in zip(replica_engines, replica_pool_metrics):
+    _metrics.attach(_replica)
+_replica_cycle = itertools.cycle(replica_engines)
+
+
+def _checked_out(replica: AsyncEngine) -> int:
+    pool = replica.sync_engine.pool
+    return pool.checkedout() if isinstance(pool, QueuePool) else 0
+
+
+def _choose_replica() -> AsyncEngine:
+    """按配置的策略（轮询 / 最少连接）选择只读副本"""
+    if settings.DB_REPLICA_STRATEGY == "least_connections":
+        return min(replica_engines, key=_checked_out)
+    return next(_replica_cycle)
+
+
+class RoutingSession(Session):
+    """
+    读写分离会话
+    
+    SELECT 语句路由到只读副本；INSERT/UPDATE/DELETE、flush 以及其他语句走主库。
+    会话一旦写过主库，后续读取也固定在主库，保证事务内读到自己的写入。
+    """
+    
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not replica_engines:
+            return engine.sync_engine
+        if self.info.get("use_primary"):
+            return engine.sync_engine
+        if self._flushing or clause is None or not getattr(clause, "is_select", False):
+            self.info["use_primary"] = True
+            return engine.sync_engine
+        return _choose_replica().sync_engine
+
+
+def use_primary(db: AsyncSession) -> None:
+    """
+    强制当前会话后续所有语句走主库（需要读到最新数据时使用）
+    
+    Args:
+        db: 数据库会话
+    """
+    db.sync_session.info["use_primary"] = True
 
-# 创建异步数据库引擎
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,  # 调试模式下打印 SQL 语句
-    future=True
-)
 
 # 创建异步会话工厂
 async_session_maker = async_sessionmaker(
     engine,
     class_=AsyncSession,
+    sync_session_class=RoutingSession,
     expire_on_commit=False,
     autocommit=False,
     autoflush=False
@@ -47,6 +176,57 @@ async def get_db() -> AsyncSession:
             await session.close()
 
 
+_AFTER_COMMIT_KEY = "after_commit_callbacks"
+
+
+def run_after_commit(db: AsyncSession, callback: Callable[[], Any]) -> None:
+    """
+    注册在当前事务提交后执行的回调（事务回滚时丢弃）
+    
+    在 savepoint（begin_nested）内注册的回调随该 savepoint 回滚一起丢弃；
+    savepoint 释放时不执行，等最外层事务提交后才执行。
+    
+    Args:
+        db: 数据库会话
+        callback: 无参回调函数
+    """
+    session = db.sync_session
+    session.info.setdefault(_AFTER_COMMIT_KEY, []).append((session.get_nested_transaction(), callback))
+
+
+def _within(transaction, ancestor) -> bool:
+    while transaction is not None:
+        if transaction is ancestor:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+@event.listens_for(Session, "after_commit")
+def _run_after_commit_callbacks(session: Session) -> None:
+    if session.in_nested_transaction():
+        # savepoint 释放，外层事务尚未提交
+        return
+    for _, callback in session.info.pop(_AFTER_COMMIT_KEY, ()):
+        callback()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_after_commit_callbacks(session: Session, previous_transaction) -> None:
+    if previous_transaction.parent is None:
+        session.info.pop(_AFTER_COMMIT_KEY, None)
+        return
+    if not previous_transaction.nested:
+        # flush 内部的子事务，回滚范围由随后外层 savepoint / 事务的回滚事件处理
+        return
+    callbacks = session.info.get(_AFTER_COMMIT_KEY)
+    if callbacks:
+        callbacks[:] = [
+            (transaction, callback) for transaction, callback in callbacks
+            if not _within(transaction, previous_transaction)
+        ]
+
+
 async def init_db():
     """
     初始化数据库（创建所有表）
@@ -60,3 +240,5 @@ async def close_db():
     关闭数据库连接
     """
     await engine.dispose()
+    for replica in replica_engines:
+        await replica.dispose()
@@ -0,0 +1,141 @@
+"""
+数据库连接池监控模块
+通过 SQLAlchemy 连接池事件统计每个 worker 的连接池使用情况
+"""
+import os
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# 获取连接等待时间直方图的桶上界（秒）
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+
+
+class PoolMetrics:
+    """连接池统计（每个 worker 进程内每个引擎一份）"""
+
+    def __init__(self, name: str = "primary"):
+        self.name = name
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.max_checked_out = 0
+        self.wait_count = 0
+        self.wait_sum = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+
+    def attach(self, engine: AsyncEngine) -> None:
+        """在引擎上注册连接池事件，并让带计时的连接池把等待时间记到本实例"""
+        sync_engine = engine.sync_engine
+        if isinstance(sync_engine.pool, TimedAsyncAdaptedQueuePool):
+            sync_engine.pool.metrics = self
+        event.listen(sync_engine, "connect", self._on_connect)
+        event.listen(sync_engine, "checkout", self._on_checkout)
+        event.listen(sync_engine, "checkin", self._on_checkin)
+        event.listen(sync_engine, "invalidate", self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:
+        self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        self.checkouts += 1
+        self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception) -> None:
+        self.invalidations += 1
+
+    @property
+    def checked_out(self) -> int:
+        return self.checkouts - self.checkins
+
+    def observe_wait(self, seconds: float) -> None:
+        """记录一次获取连接的等待时间"""
+        self.wait_count += 1
+        self.wait_sum += seconds
+        self.wait_buckets[bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def snapshot(self, engine: AsyncEngine) -> Dict[str, Any]:
+        """
+        获取连接池统计快照
+
+        Args:
+            engine: 异步数据库引擎
+
+        Returns:
+            dict: 连接池配置、当前状态与累计统计
+        """
+        pool = engine.sync_engine.pool
+        data: Dict[str, Any] = {
+            "name": self.name,
+            "pid": os.getpid(),
+            "pool_class": type(pool).__name__,
+            "checked_out": self.checked_out,
+            "max_checked_out": self.max_checked_out,
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+        }
+        if isinstance(pool, QueuePool):
+            data.update({
+                "pool_size": pool.size(),
+                "overflow": pool.overflow(),
+                "checked_in": pool.checkedin(),
+            })
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(WAIT_BUCKETS, self.wait_buckets):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        data["wait_seconds"] = {
+            "count": self.wait_count,
+            "sum": round(self.wait_sum, 6),
+            "buckets": buckets,
+        }
+        return data
+
+
+# 主库连接池统计（只读副本各自单独统计，见 database.replica_pool_metrics）
+pool_metrics = PoolMetrics("primary")
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """
+    记录获取连接等待时间的连接池
+
+    连接池事件只在拿到连接之后触发，无法反映排队时间，
+    因此在取连接的入口处计时。计时记到 PoolMetrics.attach 关联的实例，
+    未关联时不记录。
+    """
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        metrics = self.metrics
+        if metrics is None:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.timeouts += 1
+            raise
+        finally:
+            metrics.observe_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() 会重建连接池，保留关联的统计实例
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
@@ -0,0 +1,315 @@
+"""
+缓存失效通知模块
+在同一主机的多个 gunicorn worker（或多台主机）之间广播缓存失效消息
+"""
+import asyncio
+import hashlib
+import os
+import socket
+import stat
+import tempfile
+import uuid
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Set, Union
+
+from app.core.config import settings
+from app.core.logging_config import logger
+
+InvalidationHandler = Callable[[str], None]
+ResetHandler = Callable[[], None]
+
+
+class InvalidationBus:
+    """
+    失效通知总线基类
+
+    消息格式为 "<类型>:<键>"，例如 "user:alice"。
+    publish() 先在本进程内同步分发，再广播给其他 worker；
+    收到其他 worker 的消息后分发给本进程订阅者。
+    可能漏收消息时（例如与 Redis 的连接断开后恢复）通知 reset 订阅者清空整个缓存。
+    """
+
+    def __init__(self):
+        self._handlers: List[InvalidationHandler] = []
+        self._reset_handlers: List[ResetHandler] = []
+        self.malformed = 0
+        self.resets = 0
+
+    def subscribe(self, handler: InvalidationHandler, on_reset: Optional[ResetHandler] = None) -> None:
+        """
+        注册消息处理函数
+
+        Args:
+            handler: 处理单条失效消息
+            on_reset: 可能漏收消息时调用，应清空对应的缓存
+        """
+        self._handlers.append(handler)
+        if on_reset is not None:
+            self._reset_handlers.append(on_reset)
+
+    def publish(self, message: str) -> None:
+        """
+        发布失效消息
+
+        Args:
+            message: 失效消息，例如 "user:alice"
+        """
+        self._dispatch(message)
+        self._broadcast(message)
+
+    def _receive(self, data: Union[bytes, str]) -> None:
+        """分发其他 worker 发来的消息，格式不正确的消息计数后丢弃"""
+        try:
+            message = data.decode("utf-8") if isinstance(data, bytes) else data
+        except UnicodeDecodeError:
+            message = ""
+        kind, sep, key = message.partition(":")
+        if not (kind and sep and key):
+            self.malformed += 1
+            logger.debug(f"忽略格式不正确的失效消息: {data[:64]!r}")
+            return
+        self._dispatch(message)
+
+    def _dispatch(self, message: str) -> None:
+        for handler in self._handlers:
+            try:
+                handler(message)
+            except Exception:
+                logger.exception(f"处理失效消息失败: {message}")
+
+    def _reset(self) -> None:
+        self.resets += 1
+        for handler in self._reset_handlers:
+            try:
+                handler()
+            except Exception:
+                logger.exception("清空缓存失败")
+
+    def _broadcast(self, message: str) -> None:
+        """发送给其他 worker（子类实现）"""
+
+    async def start(self) -> None:
+        """启动监听（在 worker 进程内调用）"""
+
+    async def stop(self) -> None:
+        """停止监听并释放资源"""
+
+
+class LocalInvalidationBus(InvalidationBus):
+    """仅本进程内分发（单 worker 部署）"""
+
+
+class UnixSocketInvalidationBus(InvalidationBus):
+    """
+    基于 Unix 数据报套接字的单机广播
+
+    每个 worker 在 socket_dir 下绑定 "<pid>.sock"，发布时向目录中的
+    其他套接字逐一 sendto。接收端通过事件循环的 add_reader 回调处理，
+    延迟在毫秒以内；已退出 worker 遗留的套接字文件会在发送失败时清理。
+
+    socket_dir 必须属于当前用户且权限为 0700，其他本地用户无法
+    收发失效消息；每个应用应使用各自的目录。
+    """
+
+    def __init__(self, socket_dir: str):
+        super().__init__()
+        self.socket_dir = Path(socket_dir)
+        self._path: Optional[Path] = None
+        self._sock: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _prepare_dir(self) -> None:
+        """
+        创建套接字目录并检查属主与权限
+
+        Raises:
+            PermissionError: 目录不属于当前用户、不是目录或是符号链接
+        """
+        self.socket_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        info = os.lstat(self.socket_dir)
+        if not stat.S_ISDIR(info.st_mode):
+            raise PermissionError(f"失效通知目录不是普通目录: {self.socket_dir}")
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"失效通知目录不属于当前用户: {self.socket_dir}")
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            os.chmod(self.socket_dir, 0o700)
+
+    async def start(self) -> None:
+        self._prepare_dir()
+        self._path = self.socket_dir / f"{os.getpid()}.sock"
+        if self._path.exists():
+            self._path.unlink()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(str(self._path))
+        sock.setblocking(False)
+        self._sock = sock
+        self._loop = asyncio.get_running_loop()
+        self._loop.add_reader(sock.fileno(), self._on_readable)
+
+    async def stop(self) -> None:
+        if self._sock is None:
+            return
+        self._loop.remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._sock = None
+        if self._path is not None and self._path.exists():
+            self._path.unlink()
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                data = self._sock.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                return
+            self._receive(data)
+
+    def _broadcast(self, message: str) -> None:
+        if self._sock is None:
+            return
+        data = message.encode("utf-8")
+        with os.scandir(self.socket_dir) as entries:
+            peers = [
+                entry.path for entry in entries
+                if entry.name.endswith(".sock") and entry.path != str(self._path)
+            ]
+        for peer in peers:
+            try:
+                self._sock.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # 对端 worker 已退出，清理遗留的套接字文件
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except BlockingIOError:
+                logger.warning(f"失效消息发送失败（对端接收缓冲区已满）: {peer}")
+
+
+class RedisInvalidationBus(InvalidationBus):
+    """
+    基于 Redis Pub/Sub 的跨主机广播
+
+    client 可以注入任意兼容 redis.asyncio 的客户端（例如 fakeredis），
+    未注入时使用全局 Redis 客户端。
+    连接断开时记录日志并按指数退避重新订阅；断开期间的消息无法补收，
+    重新订阅成功后清空本地缓存。
+    """
+
+    RECONNECT_MIN_DELAY = 0.5
+    RECONNECT_MAX_DELAY = 30.0
+
+    def __init__(self, channel: str, client: Any = None):
+        super().__init__()
+        self.channel = channel
+        self._client = client
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._pending: Set[asyncio.Task] = set()
+        # 用于识别并忽略自己发出的消息（本进程已同步分发过）
+        self._node_id = uuid.uuid4().hex
+
+    async def start(self) -> None:
+        if self._client is None:
+            from app.core.redis import get_redis
+            self._client = get_redis()
+        await self._subscribe()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self._close_pubsub()
+
+    async def _subscribe(self) -> None:
+        self._pubsub = self._client.pubsub()
+        await self._pubsub.subscribe(self.channel)
+
+    async def _close_pubsub(self) -> None:
+        if self._pubsub is None:
+            return
+        pubsub, self._pubsub = self._pubsub, None
+        try:
+            await pubsub.aclose()
+        except Exception:
+            pass
+
+    async def _listen(self) -> None:
+        delay = self.RECONNECT_MIN_DELAY
+        while True:
+            try:
+                if self._pubsub is None:
+                    await self._subscribe()
+                    logger.info(f"失效通知已重新订阅 Redis 频道 {self.channel}，清空本地缓存")
+                    self._reset()
+                    delay = self.RECONNECT_MIN_DELAY
+                async for item in self._pubsub.listen():
+                    self._handle_item(item)
+                raise ConnectionError("订阅已结束")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.error(f"失效通知 Redis 订阅中断，{delay:.1f}s 后重试: {exc!r}")
+                await self._close_pubsub()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+
+    def _handle_item(self, item: dict) -> None:
+        if item.get("type") != "message":
+            return
+        data = item["data"]
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", errors="replace")
+        sender, _, message = data.partition("|")
+        if sender != self._node_id:
+            self._receive(message)
+
+    def _broadcast(self, message: str) -> None:
+        if self._client is None:
+            return
+        task = asyncio.get_running_loop().create_task(
+            self._client.publish(self.channel, f"{self._node_id}|{message}")
+        )
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+
+def default_socket_dir() -> Path:
+    """
+    未配置 INVALIDATION_SOCKET_DIR 时使用的套接字目录
+
+    优先放在 $XDG_RUNTIME_DIR（本用户独占）下，否则放在临时目录下；
+    目录名包含用户 ID 与应用目录的摘要，同一主机上的不同应用、不同用户互不干扰。
+
+    Returns:
+        Path: 套接字目录
+    """
+    app_root = Path(__file__).resolve().parents[2]
+    digest = hashlib.sha256(str(app_root).encode("utf-8")).hexdigest()[:12]
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return Path(runtime_dir) / f"fastapi-invalidation-{digest}"
+    return Path(tempfile.gettempdir()) / f"fastapi-invalidation-{os.getuid()}-{digest}"
+
+
+def create_invalidation_bus() -> InvalidationBus:
+    """
+    根据配置创建失效通知总线
+
+    Returns:
+        InvalidationBus: 失效通知总线实例
+    """
+    backend = settings.INVALIDATION_BACKEND
+    if backend == "redis":
+        return RedisInvalidationBus(channel=settings.INVALIDATION_CHANNEL)
+    if backend == "unix" and hasattr(socket, "AF_UNIX"):
+        return UnixSocketInvalidationBus(socket_dir=settings.INVALIDATION_SOCKET_DIR or str(default_socket_dir()))
+    return LocalInvalidationBus()
+
+
+# 全局失效通知总线
+invalidation_bus = create_invalidation_bus()
@@ -2,15 +2,41 @@
 日志配置模块
 提供结构化、详细的日志记录
 """
+import atexit
+import json
 import logging
+import os
+import queue
 import sys
+import threading
+import traceback
+from logging.handlers import WatchedFileHandler
 from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
 from loguru import logger
 from app.core.config import settings
+from app.core.request_context import current_request
 
 # 移除默认的 logger 处理器
 logger.remove()
 
+
+def _add_request_context(record: dict) -> None:
+    """为请求内输出的日志加上请求 ID 和 trace_id（请求外为 "-"）"""
+    extra = record["extra"]
+    if "request_id" in extra:
+        return
+    context = current_request.get()
+    if context is None:
+        extra["request_id"] = "-"
+        return
+    extra["request_id"] = context.request_id
+    if context.trace_id is not None:
+        extra["trace_id"] = context.trace_id
+
+
+logger.configure(patcher=_add_request_context)
+
 # 日志目录
 LOG_DIR = Path("/var/log/fastapi") if not settings.DEBUG else Path("logs")
 LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -20,6 +46,7 @@ LOG_FORMAT = (
     "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | "
     "<level>{level: <8}</level> | "
     "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
+    "<magenta>{extra[request_id]}</magenta> | "
     "<level>{message}</level>"
 )
 
@@ -32,41 +59,230 @@ if settings.DEBUG:
         colorize=True,
     )
 
-# 通用日志文件
-logger.add(
-    LOG_DIR / "app.log",
-    format=LOG_FORMAT,
-    level="INFO",
-    rotation="00:00",  # 每天午夜轮转
-    retention="7 days",  # 保留 7 天
-    compression="gz",  # 压缩旧日志
-    encoding="utf-8",
-)
+class QueuedSink:
+    """
+    后台线程写入的 loguru sink
 
-# 错误日志文件
-logger.add(
-    LOG_DIR / "error.log",
-    format=LOG_FORMAT,
-    level="ERROR",
-    rotation="100 MB",  # 100MB 轮转
-    retention="30 days",  # 保留 30 天
-    compression="gz",
-    encoding="utf-8",
-    backtrace=True,  # 显示完整堆栈
-    diagnose=True,  # 显示变量值
-)
+    请求路径上只把消息放入有界队列，由后台线程交给标准库的文件
+    handler 写盘。队列满时按 LOG_OVERFLOW_POLICY 丢弃（计入 dropped）
+    或阻塞等待。serializer 不为空时入队的是 record，序列化也在后台线程完成。
+    """
 
-# JSON 格式日志（便于分析）
-logger.add(
-    LOG_DIR / "access.json",
-    format="{message}",
-    level="INFO",
-    rotation="00:00",
-    retention="7 days",
-    compression="gz",
-    encoding="utf-8",
-    serialize=True,  # JSON 序列化
-)
+    _STOP = object()
+
+    def __init__(
+        self,
+        name: str,
+        handler: logging.Handler,
+        maxsize: int,
+        policy: str = "drop",
+        serializer: Optional[Callable[[dict], str]] = None,
+    ):
+        self.name = name
+        self.handler = handler
+        self.policy = policy
+        self.serializer = serializer
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._start()
+
+    def _start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name=f"log-sink-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def __call__(self, message) -> None:
+        item = message.record if self.serializer is not None else str(message)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            if self.policy == "block":
+                self._queue.put(item)
+            else:
+                self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            try:
+                text = self.serializer(item) if self.serializer is not None else item
+                self.handler.handle(logging.makeLogRecord({"msg": text}))
+                self.written += 1
+            except Exception:
+                self.handler.handleError(logging.makeLogRecord({"msg": "log sink error"}))
+
+    def stop(self) -> None:
+        """写完队列中剩余的日志并关闭文件"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+        self._thread = None
+        self.handler.close()
+
+    def after_fork(self) -> None:
+        """fork 后线程不会被继承，在子进程中重新启动"""
+        self._queue = queue.Queue(self._queue.maxsize)
+        self._start()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "maxsize": self._queue.maxsize,
+            "policy": self.policy,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+def _file_handler(filename: str) -> logging.Handler:
+    """
+    创建文件 handler（不在进程内轮转）
+
+    多个 worker 各自持有 handler，若各自轮转会互相删除、覆盖归档。
+    轮转交给 logrotate 统一完成，WatchedFileHandler 发现文件被移走后重新打开。
+
+    Args:
+        filename: 日志文件名（位于 LOG_DIR 下）
+
+    Returns:
+        logging.Handler: 文件 handler
+    """
+    handler = WatchedFileHandler(LOG_DIR / filename, encoding="utf-8")
+    handler.terminator = ""  # loguru 格式化后的消息已带换行
+    return handler
+
+
+try:
+    import orjson
+
+    def _dumps(data: dict) -> str:
+        return orjson.dumps(data, default=str).decode("utf-8")
+except ImportError:
+    def _dumps(data: dict) -> str:
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def serialize_record(record: dict) -> str:
+    """
+    把 loguru record 序列化为一行 JSON
+
+    只保留日志分析用到的字段，结构与 loguru serialize=True 的
+    {"text": ..., "record": {...}} 保持一致。
+    """
+    exception = record["exception"]
+    return _dumps({
+        "text": record["message"],
+        "record": {
+            "time": {
+                "repr": str(record["time"]),
+                "timestamp": record["time"].timestamp(),
+            },
+            "level": {"name": record["level"].name, "no": record["level"].no},
+            "name": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+            "message": record["message"],
+            "extra": record["extra"],
+            "process": {"id": record["process"].id},
+            "exception": (
+                "".join(traceback.format_exception(exception.type, exception.value, exception.traceback))
+                if exception else None
+            ),
+        },
+    }) + "\n"
+
+
+# 后台写入的 sink（LOG_ASYNC 开启时使用，文件轮转由 logrotate 完成）
+queued_sinks: List[QueuedSink] = []
+_queued_handler_ids: List[int] = []
+
+if settings.LOG_ASYNC:
+    queued_sinks = [
+        QueuedSink(
+            "app", _file_handler("app.log"),
+            settings.LOG_QUEUE_SIZE, settings.LOG_OVERFLOW_POLICY,
+        ),
+        QueuedSink(
+            "error", _file_handler("error.log"),
+            settings.LOG_QUEUE_SIZE, settings.LOG_OVERFLOW_POLICY,
+        ),
+        QueuedSink(
+            "access", _file_handler("access.json"),
+            settings.LOG_QUEUE_SIZE, settings.LOG_OVERFLOW_POLICY,
+            serializer=serialize_record,
+        ),
+    ]
+    app_sink, error_sink, access_sink = queued_sinks
+    _queued_handler_ids = [
+        logger.add(app_sink, format=LOG_FORMAT, level="INFO", colorize=False),
+        logger.add(
+            error_sink, format=LOG_FORMAT, level="ERROR", colorize=False,
+            backtrace=True, diagnose=settings.DEBUG,
+        ),
+        logger.add(access_sink, format="{message}", level="INFO"),
+    ]
+    os.register_at_fork(after_in_child=lambda: [sink.after_fork() for sink in queued_sinks])
+    atexit.register(lambda: shutdown_logging())
+else:
+    # 通用日志文件
+    logger.add(
+        LOG_DIR / "app.log",
+        format=LOG_FORMAT,
+        level="INFO",
+        rotation="00:00",  # 每天午夜轮转
+        retention="7 days",  # 保留 7 天
+        compression="gz",  # 压缩旧日志
+        encoding="utf-8",
+    )
+
+    # 错误日志文件
+    logger.add(
+        LOG_DIR / "error.log",
+        format=LOG_FORMAT,
+        level="ERROR",
+        rotation="100 MB",  # 100MB 轮转
+        retention="30 days",  # 保留 30 天
+        compression="gz",
+        encoding="utf-8",
+        backtrace=True,  # 显示完整堆栈
+        diagnose=settings.DEBUG,  # 显示变量值（可能包含敏感数据，仅调试模式开启）
+    )
+
+    # JSON 格式日志（便于分析）
+    logger.add(
+        LOG_DIR / "access.json",
+        format="{message}",
+        level="INFO",
+        rotation="00:00",
+        retention="7 days",
+        compression="gz",
+        encoding="utf-8",
+        serialize=True,  # JSON 序列化
+    )
+
+
+def get_sink_stats() -> Dict[str, Any]:
+    """
+    后台日志 sink 的队列与丢弃统计
+
+    Returns:
+        dict: 每个 sink 的统计，未开启 LOG_ASYNC 时为空
+    """
+    return {sink.name: sink.stats() for sink in queued_sinks}
+
+
+def shutdown_logging() -> None:
+    """写完缓冲中的日志并停止后台线程（进程退出前调用）"""
+    for handler_id in _queued_handler_ids:
+        logger.remove(handler_id)
+    _queued_handler_ids.clear()
+    for sink in queued_sinks:
+        sink.stop()
 
 
 def get_logger(name: str = None):
@@ -85,24 +301,41 @@ def get_logger(name: str = None):
 
 
 # 拦截标准库的 logging
+_LEVEL_NAMES = {
+    logging.CRITICAL: "CRITICAL",
+    logging.ERROR: "ERROR",
+    logging.WARNING: "WARNING",
+    logging.INFO: "INFO",
+    logging.DEBUG: "DEBUG",
+}
+_std_record = threading.local()
+
+
+def _patch_std_location(record: dict) -> None:
+    """用标准库 LogRecord 中已有的调用位置替换 loguru 的调用位置"""
+    std = _std_record.value
+    record["name"] = std.name
+    record["function"] = std.funcName
+    record["line"] = std.lineno
+
+
+_std_logger = logger.patch(_patch_std_location)
+
+
 class InterceptHandler(logging.Handler):
     """
     拦截标准库的 logging，转发到 loguru
+
+    标准库在创建 LogRecord 时已经查找过调用位置，这里直接复用，
+    不再逐帧回溯调用栈。
     """
     def emit(self, record):
+        level = _LEVEL_NAMES.get(record.levelno, record.levelno)
+        _std_record.value = record
         try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = record.levelno
-
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back
-            depth += 1
-
-        logger.opt(depth=depth, exception=record.exc_info).log(
-            level, record.getMessage()
-        )
+            _std_logger.opt(exception=record.exc_info).log(level, record.getMessage())
+        finally:
+            _std_record.value = None
 
 
 # 配置标准库 logging
@@ -0,0 +1,421 @@
+"""
+指标模块
+进程内的计数器与固定桶直方图，以 Prometheus 文本格式导出；
+多 worker 部署时各 worker 把快照写入共享目录，抓取时汇总
+"""
+import asyncio
+import contextvars
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+from app.core.logging_config import logger
+
+Labels = Tuple[str, ...]
+
+# 请求耗时直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+# 单次 SQL 耗时直方图的桶上界（秒）
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, float("inf"))
+# 每个请求的 SQL 条数直方图的桶上界
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, float("inf"))
+# bcrypt 耗时直方图的桶上界（秒）
+HASH_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+
+class Counter:
+    """单调递增计数器"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        self._functions: Dict[Labels, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1.0) -> None:
+        """
+        增加计数
+
+        Args:
+            labels: 与 labelnames 顺序一致的标签值
+            amount: 增量
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set_function(self, func: Callable[[], float], labels: Labels = ()) -> None:
+        """
+        导出时调用 func 读取当前值（数值已由其他对象维护时使用，例如计算池的拒绝数）
+
+        Args:
+            func: 返回当前值的无参函数
+            labels: 与 labelnames 顺序一致的标签值
+        """
+        with self._lock:
+            self._functions[labels] = func
+
+    def dump(self) -> List[list]:
+        with self._lock:
+            values = dict(self._values)
+            functions = list(self._functions.items())
+        for labels, func in functions:
+            values[labels] = float(func())
+        return [[list(labels), value] for labels, value in values.items()]
+
+
+class Gauge(Counter):
+    """
+    瞬时值（可增可减）
+
+    多 worker 汇总时只合计仍在运行的 worker，已退出 worker 的最后取值不计入。
+    """
+
+    type = "gauge"
+
+    def set(self, value: float, labels: Labels = ()) -> None:
+        """
+        设置当前值
+
+        Args:
+            value: 当前值
+            labels: 与 labelnames 顺序一致的标签值
+        """
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram:
+    """固定桶直方图（导出时转换为累积计数）"""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [各桶计数..., sum]
+        self._values: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        """
+        记录一个观测值
+
+        Args:
+            value: 观测值
+            labels: 与 labelnames 顺序一致的标签值
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * len(self.buckets) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def dump(self) -> List[list]:
+        with self._lock:
+            return [[list(labels), list(series)] for labels, series in self._values.items()]
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标已注册: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        导出本进程的指标快照（可 JSON 序列化）
+
+        Returns:
+            dict: 指标名 -> 类型、说明、标签名、桶与各序列的值
+        """
+        return {
+            name: {
+                "type": metric.type,
+                "help": metric.documentation,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "samples": metric.dump(),
+            }
+            for name, metric in self._metrics.items()
+        }
+
+    def render(self, directory: Optional[str] = None) -> str:
+        """
+        生成 Prometheus 文本格式
+
+        Args:
+            directory: 多进程快照目录，为空时只导出本进程
+
+        Returns:
+            str: 文本格式的指标
+        """
+        if not directory:
+            return render_snapshot(self.snapshot())
+        write_snapshot(self.snapshot(), directory)
+        return render_snapshot(merge_snapshots(read_snapshots(directory)))
+
+
+def write_snapshot(snapshot: Dict[str, Any], directory: str) -> None:
+    """把本进程的快照原子地写入 <directory>/<pid>.json"""
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    target = path / f"{os.getpid()}.json"
+    tmp = path / f".{os.getpid()}.json.tmp"
+    tmp.write_text(json.dumps(snapshot), encoding="utf-8")
+    os.replace(tmp, target)
+
+
+def read_snapshots(directory: str) -> List[Dict[str, Any]]:
+    """
+    读取目录中所有 worker 的快照
+
+    已退出 worker 的快照会保留并参与汇总，保证计数器单调递增；
+    其中的 gauge 是过期的瞬时值，不参与汇总。
+    部署时应在启动 gunicorn 前清空该目录。
+    """
+    snapshots = []
+    for file in Path(directory).glob("*.json"):
+        try:
+            snapshot = json.loads(file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if not _process_alive(file.stem):
+            snapshot = {name: data for name, data in snapshot.items() if data["type"] != "gauge"}
+        snapshots.append(snapshot)
+    return snapshots
+
+
+def _process_alive(pid: str) -> bool:
+    """快照文件名中的 pid 对应的进程是否仍在运行"""
+    try:
+        os.kill(int(pid), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """按指标名与标签值把多个快照相加"""
+    merged: Dict[str, Any] = {}
+    for snapshot in snapshots:
+        for name, data in snapshot.items():
+            target = merged.setdefault(name, {**data, "samples": {}})
+            for labels, value in data["samples"]:
+                key = tuple(labels)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif data["type"] == "histogram":
+                    target["samples"][key] = [a + b for a, b in zip(current, value)]
+                else:
+                    target["samples"][key] = current + value
+    for data in merged.values():
+        data["samples"] = [[list(key), value] for key, value in data["samples"].items()]
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def render_snapshot(snapshot: Dict[str, Any]) -> str:
+    """把快照转换为 Prometheus 文本格式"""
+    lines = []
+    for name, data in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['type']}")
+        names = data["labelnames"]
+        for labels, value in sorted(data["samples"]):
+            if data["type"] == "histogram":
+                cumulative = 0
+                for bound, count in zip(data["buckets"], value[:-1]):
+                    cumulative += count
+                    le = f'le="{_format_bound(bound)}"'
+                    lines.append(f"{name}_bucket{_format_labels(names, labels, le)} {cumulative}")
+                label_text = _format_labels(names, labels)
+                lines.append(f"{name}_sum{label_text} {value[-1]}")
+                lines.append(f"{name}_count{label_text} {cumulative}")
+            else:
+                lines.append(f"{name}{_format_labels(names, labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class MultiprocessExporter:
+    """
+    定期把本 worker 的快照写入共享目录
+
+    处理 /metrics 的 worker 会在抓取时写入最新快照，
+    其他 worker 的数据最多滞后 interval 秒。
+    """
+
+    def __init__(self, registry: MetricsRegistry, directory: str, interval: float):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if not self.directory:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        write_snapshot(self.registry.snapshot(), self.directory)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                write_snapshot(self.registry.snapshot(), self.directory)
+            except OSError:
+                logger.exception(f"写入指标快照失败: {self.directory}")
+            await asyncio.sleep(self.interval)
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP 请求总数", ("method", "route", "status"),
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP 请求处理耗时（秒）", ("method", "route", "status"),
+)
+http_request_db_queries = registry.histogram(
+    "http_request_db_queries", "每个 HTTP 请求执行的 SQL 条数", ("method", "route"),
+    buckets=QUERY_COUNT_BUCKETS,
+)
+http_request_db_seconds = registry.histogram(
+    "http_request_db_seconds", "每个 HTTP 请求的 SQL 总耗时（秒）", ("method", "route"),
+)
+db_query_duration_seconds = registry.histogram(
+    "db_query_duration_seconds", "单条 SQL 执行耗时（秒）", buckets=QUERY_BUCKETS,
+)
+password_hash_seconds = registry.histogram(
+    "password_hash_seconds", "bcrypt 计算耗时（秒，不含排队）", ("operation",),
+    buckets=HASH_BUCKETS,
+)
+password_hash_in_flight = registry.gauge(
+    "password_hash_in_flight", "bcrypt 计算池在途任务数（执行中与排队中）",
+)
+password_hash_queue_depth = registry.gauge(
+    "password_hash_queue_depth", "bcrypt 计算池中排队、尚未开始执行的任务数",
+)
+password_hash_rejected_total = registry.counter(
+    "password_hash_rejected_total", "bcrypt 计算池已满而直接返回 503 的次数",
+)
+cache_hits_total = registry.counter(
+    "cache_hits_total", "进程内缓存命中次数", ("cache",),
+)
+cache_misses_total = registry.counter(
+    "cache_misses_total", "进程内缓存未命中次数（含已过期）", ("cache",),
+)
+cache_entries = registry.gauge(
+    "cache_entries", "进程内缓存当前条目数", ("cache",),
+)
+
+metrics_exporter = MultiprocessExporter(
+    registry, settings.METRICS_MULTIPROC_DIR, settings.METRICS_FLUSH_INTERVAL,
+)
+
+
+class QueryStats:
+    """单个请求的 SQL 统计"""
+
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# 当前请求的 SQL 统计（由指标中间件设置）
+current_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar(
+    "current_query_stats", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    start = getattr(context, "_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    db_query_duration_seconds.observe(elapsed)
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+
+
+def attach_query_metrics(engine: AsyncEngine) -> None:
+    """在引擎上注册 SQL 计时事件"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
@@ -0,0 +1,206 @@
+"""
+限流模块
+基于令牌桶的限流，支持进程内和 Redis（跨 worker 共享）两种后端
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.logging_config import logger
+
+# 限流键中用户名的最大长度，避免超长用户名占用内存
+MAX_KEY_LENGTH = 128
+
+
+class RateLimitExceeded(Exception):
+    """超出限流"""
+
+    def __init__(self, limit: str, retry_after: float):
+        self.limit = limit
+        self.retry_after = retry_after
+        super().__init__(f"rate limit exceeded: {limit}")
+
+
+class MemoryTokenBuckets:
+    """
+    进程内令牌桶
+
+    每个键一个桶：容量 capacity，每秒补充 refill_rate 个令牌。
+    桶保存在 OrderedDict 中按最近使用排序，超过 max_keys 时淘汰最久未使用的桶，
+    每次操作都是 O(1)，内存有上界（被淘汰的键下次出现时按满桶计算）。
+    """
+
+    def __init__(self, capacity: float, refill_rate: float, max_keys: int):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def acquire(self, key: str, cost: float = 1.0) -> float:
+        """
+        尝试从桶中取出令牌
+
+        Args:
+            key: 限流键
+            cost: 消耗的令牌数
+
+        Returns:
+            float: 0 表示放行，否则为需要等待的秒数
+        """
+        now = time.monotonic()
+        with self._lock:
+            item = self._buckets.get(key)
+            if item is None:
+                tokens = self.capacity
+            else:
+                tokens, updated_at = item
+                tokens = min(self.capacity, tokens + (now - updated_at) * self.refill_rate)
+                self._buckets.move_to_end(key)
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = 0.0
+            else:
+                retry_after = (cost - tokens) / self.refill_rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+# 原子地补充并扣减令牌，时间取 Redis 服务器时钟，保证多台主机一致
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(retry_after)
+"""
+
+
+class RedisTokenBuckets:
+    """
+    基于 Redis 的令牌桶（所有 worker 共享）
+
+    桶在补满所需的时间后自动过期，Redis 中的键数量随活跃键数增减。
+    Redis 不可用时放行请求并记录告警，避免限流组件故障导致无法登录。
+    """
+
+    def __init__(self, capacity: float, refill_rate: float, prefix: str, client: Any = None):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.prefix = prefix
+        self._client = client
+        self._script = None
+
+    async def acquire(self, key: str, cost: float = 1.0) -> float:
+        if self._script is None:
+            if self._client is None:
+                from app.core.redis import get_redis
+                self._client = get_redis()
+            self._script = self._client.register_script(_TOKEN_BUCKET_SCRIPT)
+        try:
+            result = await self._script(
+                keys=[f"{self.prefix}:{key}"],
+                args=[self.capacity, self.refill_rate, cost],
+            )
+        except Exception:
+            logger.exception("Redis 限流不可用，放行请求")
+            return 0.0
+        if isinstance(result, bytes):
+            result = result.decode("utf-8")
+        return float(result)
+
+
+def create_token_buckets(name: str, capacity: float, per_minute: float):
+    """
+    根据配置创建令牌桶
+
+    Args:
+        name: 桶名称（Redis 键前缀的一部分）
+        capacity: 桶容量（允许的突发次数）
+        per_minute: 每分钟补充的令牌数
+    """
+    refill_rate = per_minute / 60
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        return RedisTokenBuckets(capacity, refill_rate, prefix=f"ratelimit:{name}")
+    return MemoryTokenBuckets(capacity, refill_rate, max_keys=settings.RATE_LIMIT_MAX_KEYS)
+
+
+class LoginRateLimiter:
+    """
+    登录限流
+
+    按客户端 IP 和用户名分别限流：IP 桶限制单一来源的尝试次数，
+    用户名桶限制针对单个账户的分布式暴力破解。
+    在查询数据库和计算 bcrypt 之前调用。
+    """
+
+    def __init__(self, ip_buckets, username_buckets):
+        self.ip_buckets = ip_buckets
+        self.username_buckets = username_buckets
+        self._reported = TTLCache(maxsize=10000, ttl=60)
+
+    async def check(self, client_ip: str, username: str) -> None:
+        """
+        检查登录请求是否超出限制
+
+        Args:
+            client_ip: 客户端 IP
+            username: 提交的用户名或邮箱
+
+        Raises:
+            RateLimitExceeded: 超出 IP 或用户名的限制
+        """
+        retry_after = await self.ip_buckets.acquire(client_ip)
+        if retry_after:
+            raise RateLimitExceeded("ip", retry_after)
+        retry_after = await self.username_buckets.acquire(_username_key(username))
+        if retry_after:
+            raise RateLimitExceeded("username", retry_after)
+
+    def should_report(self, client_ip: str, username: str) -> bool:
+        """同一来源的限流事件每分钟只记录一次，避免攻击时日志被刷爆"""
+        key = (client_ip, _username_key(username))
+        if self._reported.get(key) is not None:
+            return False
+        self._reported.set(key, True)
+        return True
+
+
+def _username_key(username: str) -> str:
+    return username.strip().lower()[:MAX_KEY_LENGTH]
+
+
+def create_login_rate_limiter() -> Optional[LoginRateLimiter]:
+    """根据配置创建登录限流器，未开启时返回 None"""
+    if not settings.LOGIN_RATE_LIMIT_ENABLED:
+        return None
+    return LoginRateLimiter(
+        ip_buckets=create_token_buckets(
+            "login:ip", settings.LOGIN_IP_BURST, settings.LOGIN_IP_PER_MINUTE,
+        ),
+        username_buckets=create_token_buckets(
+            "login:username", settings.LOGIN_USERNAME_BURST, settings.LOGIN_USERNAME_PER_MINUTE,
+        ),
+    )
+
+
+# 全局登录限流器
+login_rate_limiter = create_login_rate_limiter()
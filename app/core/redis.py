@@ -0,0 +1,37 @@
+"""
+Redis 客户端模块
+按需创建共享的异步 Redis 客户端（redis 为可选依赖）
+"""
+from typing import Any, Optional
+
+from app.core.config import settings
+
+_client: Optional[Any] = None
+
+
+def get_redis() -> Any:
+    """
+    获取全局异步 Redis 客户端（懒加载）
+
+    Returns:
+        redis.asyncio.Redis: Redis 客户端
+
+    Raises:
+        RuntimeError: 未安装 redis 包
+    """
+    global _client
+    if _client is None:
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as exc:
+            raise RuntimeError("使用 Redis 后端需要安装 redis：pip install redis") from exc
+        _client = aioredis.from_url(settings.REDIS_URL)
+    return _client
+
+
+async def close_redis() -> None:
+    """关闭全局 Redis 客户端"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,132 @@
+"""
+请求上下文模块
+生成请求 ID、解析 W3C traceparent，并通过 contextvar 在请求内传递，
+日志、SQL 分析和慢请求采样无需显式传参即可带上请求 ID
+"""
+import contextvars
+import itertools
+import os
+import re
+from typing import Optional
+
+# 允许沿用的上游请求 ID：限制字符集和长度，避免日志注入
+_REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._:-]{1,128}")
+
+# traceparent: 版本-trace_id-parent_id-flags（https://www.w3.org/TR/trace-context/）
+_TRACEPARENT_PATTERN = re.compile(r"([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})")
+_INVALID_TRACE_ID = "0" * 32
+_INVALID_SPAN_ID = "0" * 16
+
+
+# 请求 ID 的进程前缀与计数器（进程启动和每次 fork 后重新生成）
+_prefix = ""
+_counter = itertools.count(1)
+
+
+def _reset_request_ids() -> None:
+    global _prefix, _counter
+    _prefix = os.urandom(4).hex()
+    _counter = itertools.count(1)
+
+
+_reset_request_ids()
+os.register_at_fork(after_in_child=_reset_request_ids)
+
+
+def new_request_id() -> str:
+    """
+    生成请求 ID
+
+    ID 由进程前缀和自增计数组成，例如 "3f9c2a7b-00000001a"：
+    前缀随机生成，多个 worker 之间不会冲突；计数在同一进程内单调递增，
+    按字符串排序即为生成顺序。生成一个 ID 只需一次计数器自增和一次格式化。
+    """
+    return f"{_prefix}-{next(_counter):09x}"
+
+
+class RequestContext:
+    """单个请求的追踪信息"""
+
+    __slots__ = ("request_id", "trace_id", "parent_id", "span_id", "sampled")
+
+    def __init__(
+        self,
+        request_id: str,
+        trace_id: Optional[str] = None,
+        parent_id: Optional[str] = None,
+        sampled: bool = False,
+    ):
+        self.request_id = request_id
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.span_id: Optional[str] = os.urandom(8).hex() if trace_id else None
+        self.sampled = sampled
+
+    def traceparent(self) -> Optional[str]:
+        """
+        调用下游服务时应携带的 traceparent
+
+        Returns:
+            str: 以本请求为父 span 的 traceparent，上游未传入时为 None
+        """
+        if self.trace_id is None:
+            return None
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+
+def parse_traceparent(value: str):
+    """
+    解析 traceparent 请求头
+
+    Args:
+        value: 请求头的值
+
+    Returns:
+        tuple: (trace_id, parent_id, sampled)，格式不合法时返回 None
+    """
+    match = _TRACEPARENT_PATTERN.match(value.strip().lower())
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags = match.groups()
+    if version == "ff" or trace_id == _INVALID_TRACE_ID or parent_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 0x01)
+
+
+def context_from_headers(headers, trust_request_id: bool = True) -> RequestContext:
+    """
+    根据 ASGI 请求头创建请求上下文
+
+    Args:
+        headers: scope["headers"]
+        trust_request_id: 是否沿用上游传入的 X-Request-ID
+
+    Returns:
+        RequestContext: 请求上下文
+    """
+    request_id = None
+    trace = None
+    for name, value in headers:
+        if name == b"x-request-id" and trust_request_id:
+            candidate = value.decode("latin-1")
+            if _REQUEST_ID_PATTERN.fullmatch(candidate):
+                request_id = candidate
+        elif name == b"traceparent":
+            trace = parse_traceparent(value.decode("latin-1"))
+    if request_id is None:
+        request_id = new_request_id()
+    if trace is None:
+        return RequestContext(request_id)
+    return RequestContext(request_id, *trace)
+
+
+# 当前请求的上下文（由请求日志中间件设置）
+current_request: contextvars.ContextVar[Optional[RequestContext]] = contextvars.ContextVar(
+    "current_request", default=None
+)
+
+
+def get_request_id() -> Optional[str]:
+    """当前请求的 ID，不在请求中时返回 None"""
+    context = current_request.get()
+    return context.request_id if context is not None else None
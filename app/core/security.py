@@ -2,14 +2,28 @@
 安全模块
 处理密码哈希和 JWT Token 的生成与验证
 """
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Callable, List, Optional
 from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
+from app.core.cache import ExpiringSet, TTLCache
 from app.core.config import settings
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import (
+    password_hash_in_flight,
+    password_hash_queue_depth,
+    password_hash_rejected_total,
+    password_hash_seconds,
+)
 
 # OAuth2 密码模式
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
@@ -47,6 +61,196 @@ def get_password_hash(password: str) -> str:
     return hashed.decode('utf-8')
 
 
+def _timed_call(func: Callable, *args):
+    """在计算池中执行并返回 (结果, 耗时)，耗时不含排队时间"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class PasswordHashPool:
+    """
+    bcrypt 计算池
+    
+    bcrypt 单次计算约 250ms CPU，在事件循环中同步执行会阻塞整个 worker。
+    这里把计算放到线程池（bcrypt 计算时会释放 GIL）或进程池中执行，
+    并限制同时在途的任务数：超过 max_workers + max_queue 时立即返回 503，
+    避免登录洪峰把请求无限排队。
+    """
+    
+    def __init__(self, kind: str = "thread", max_workers: Optional[int] = None, max_queue: int = 32):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"不支持的执行器类型: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+    
+    def _get_executor(self) -> Executor:
+        """懒加载执行器，避免在 gunicorn fork 之前创建线程/进程"""
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="bcrypt"
+                )
+        return self._executor
+    
+    def _release(self, _future: Future) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+    
+    async def run(self, func: Callable, *args):
+        """
+        在计算池中执行函数
+        
+        Raises:
+            HTTPException: 计算池已饱和（503）
+        """
+        with self._lock:
+            if self._in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="服务繁忙，请稍后重试",
+                    headers={"Retry-After": "1"},
+                )
+            self._in_flight += 1
+        
+        # 计数在任务真正结束时才释放，调用方被取消时不会低估池的负载
+        try:
+            future = self._get_executor().submit(_timed_call, func, *args)
+        except BaseException as exc:
+            # 提交失败（已关闭、进程池中有 worker 异常退出）时任务不会执行，立即归还名额
+            with self._lock:
+                self._in_flight -= 1
+                if isinstance(exc, BrokenExecutor):
+                    # 损坏的执行器无法再接受任务，下次调用时重新创建
+                    self._executor = None
+            raise
+        future.add_done_callback(self._release)
+        result, elapsed = await asyncio.wrap_future(future)
+        password_hash_seconds.observe(elapsed, (func.__name__.lstrip("_"),))
+        return result
+    
+    @property
+    def in_flight(self) -> int:
+        """在途（执行中与排队中）的任务数"""
+        return self._in_flight
+    
+    @property
+    def queue_depth(self) -> int:
+        """正在排队（尚未开始执行）的任务数"""
+        return max(0, self._in_flight - self.max_workers)
+    
+    def stats(self) -> dict:
+        """计算池统计信息"""
+        return {
+            "executor": self.kind,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+    
+    def shutdown(self) -> None:
+        """关闭执行器"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 全局密码哈希计算池
+password_hash_pool = PasswordHashPool(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
+password_hash_in_flight.set_function(lambda: password_hash_pool.in_flight)
+password_hash_queue_depth.set_function(lambda: password_hash_pool.queue_depth)
+password_hash_rejected_total.set_function(lambda: password_hash_pool.rejected)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    异步验证密码（在计算池中执行，不阻塞事件循环）
+    
+    Args:
+        plain_password: 用户输入的明文密码
+        hashed_password: 数据库中存储的哈希密码
+    
+    Returns:
+        bool: 密码是否匹配
+    """
+    return await password_hash_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    异步生成密码哈希（在计算池中执行，不阻塞事件循环）
+    
+    Args:
+        password: 明文密码
+    
+    Returns:
+        str: 哈希后的密码
+    """
+    return await password_hash_pool.run(get_password_hash, password)
+
+
+def _hash_many(passwords: List[str]) -> List[str]:
+    return [get_password_hash(password) for password in passwords]
+
+
+# 批量哈希每个任务包含的密码数（bcrypt 约 250ms/个，一块约 2 秒）
+BULK_HASH_CHUNK_SIZE = 8
+
+
+async def hash_passwords_async(passwords: List[str], chunk_size: int = BULK_HASH_CHUNK_SIZE) -> List[str]:
+    """
+    批量生成密码哈希（批量导入使用）
+    
+    切分为小块任务，同时最多只有 PASSWORD_HASH_BULK_SHARE 比例的 worker 在算这批密码，
+    其余 worker 继续处理登录；每块完成后才提交下一块，新块排在已等待的登录之后，
+    登录最多等待一块的计算时间。
+    
+    Args:
+        passwords: 明文密码列表
+        chunk_size: 每个任务包含的密码数
+    
+    Returns:
+        List[str]: 与输入顺序一致的哈希列表
+    """
+    if not passwords:
+        return []
+    chunks = [passwords[i:i + chunk_size] for i in range(0, len(passwords), chunk_size)]
+    results: List[List[str]] = [[] for _ in chunks]
+    pending = iter(range(len(chunks)))
+    
+    async def hash_chunks() -> None:
+        for index in pending:
+            results[index] = await password_hash_pool.run(_hash_many, chunks[index])
+    
+    concurrency = max(1, int(password_hash_pool.max_workers * settings.PASSWORD_HASH_BULK_SHARE))
+    tasks = [asyncio.ensure_future(hash_chunks()) for _ in range(min(concurrency, len(chunks)))]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    return [hashed for chunk in results for hashed in chunk]
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     创建 JWT Access Token
@@ -59,15 +263,16 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         str: 编码后的 JWT Token
     """
     to_encode = data.copy()
+    now = datetime.now(timezone.utc)
     
     if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.now(timezone.utc) + timedelta(
+        expire = now + timedelta(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(
         to_encode, 
         settings.SECRET_KEY, 
@@ -77,23 +282,104 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+# 已验证 Token 缓存：Token 摘要 -> 解码后的载荷，条目在 Token 过期时失效
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_SIZE,
+    ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+)
+token_cache.export_metrics("token")
+
+# 已吊销 Token 摘要，保留到 Token 自身过期为止（不会提前淘汰，已满时拒绝新的吊销）
+revoked_tokens = ExpiringSet(maxsize=settings.TOKEN_REVOCATION_SIZE)
+
+
+def _token_digest(token: str) -> bytes:
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+
+def _monotonic_deadline(exp: float) -> float:
+    """把 exp（Unix 时间戳）换算为 time.monotonic() 时间基准"""
+    return time.monotonic() + (exp - time.time())
+
+
+def _expires_at(payload: dict) -> float:
+    """缓存条目的过期时间：Token 过期时，且不超过缓存 TTL"""
+    return min(_monotonic_deadline(payload.get("exp", 0)), time.monotonic() + token_cache.ttl)
+
+
 def decode_access_token(token: str) -> Optional[dict]:
     """
     解码并验证 JWT Token
     
+    同一 Token 在有效期内重复使用时直接返回缓存的载荷，
+    只有首次出现的 Token 才执行签名校验和声明校验。
+    返回的字典在请求间共享，调用方不应修改。
+    
     Args:
         token: JWT Token 字符串
     
     Returns:
-        dict | None: 解码后的数据，验证失败返回 None
+        dict | None: 解码后的数据，验证失败或已吊销返回 None
     """
+    digest = _token_digest(token)
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return payload
+    
+    if digest in revoked_tokens:
+        return None
+    
     try:
         payload = jwt.decode(
             token, 
             settings.SECRET_KEY, 
             algorithms=[settings.ALGORITHM]
         )
-        return payload
     except JWTError:
         return None
+    
+    token_cache.set(digest, payload, expires_at=_expires_at(payload))
+    return payload
+
+
+def revoke_access_token(token: str) -> bool:
+    """
+    吊销 JWT Token（广播到所有 worker）
+    
+    吊销记录保存在各 worker 内存中，保留到 Token 过期为止；
+    进程重启后丢失，因此 Token 有效期（ACCESS_TOKEN_EXPIRE_MINUTES）不宜过长。
+    
+    Args:
+        token: JWT Token 字符串（调用方已验证）
+    
+    Returns:
+        bool: 是否已吊销，吊销列表已满时为 False
+    """
+    try:
+        exp = float(jwt.get_unverified_claims(token).get("exp", 0))
+    except (JWTError, TypeError, ValueError):
+        return False
+    digest = _token_digest(token)
+    if not revoked_tokens.add(digest, _monotonic_deadline(exp)):
+        return False
+    token_cache.pop(digest)
+    invalidation_bus.publish(f"token:{digest.hex()}:{exp:.0f}")
+    return True
+
+
+def _handle_invalidation(message: str) -> None:
+    """处理失效通知：token:<摘要>:<过期时间戳>"""
+    kind, _, key = message.partition(":")
+    if kind == "token":
+        digest_hex, _, exp = key.partition(":")
+        try:
+            digest = bytes.fromhex(digest_hex)
+            deadline = _monotonic_deadline(float(exp)) if exp else time.monotonic() + token_cache.ttl
+        except ValueError:
+            return
+        token_cache.pop(digest)
+        revoked_tokens.add(digest, deadline)
+
+
+invalidation_bus.subscribe(_handle_invalidation, on_reset=token_cache.clear)
 
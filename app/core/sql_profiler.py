@@ -0,0 +1,179 @@
+"""
+SQL 分析器模块
+按请求记录执行的 SQL 语句条数、耗时和重复语句，用于发现 N+1 查询
+"""
+import contextvars
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.core.config import settings
+
+# 告警和接口中展示的语句最大长度
+STATEMENT_PREVIEW_LENGTH = 300
+
+
+class StatementStats:
+    """同一条语句（参数化后的 SQL 文本）在一个请求内的统计"""
+
+    __slots__ = ("count", "seconds", "params")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.params: set = set()
+
+
+class RequestProfile:
+    """单个请求的 SQL 分析结果"""
+
+    def __init__(self, method: str, path: str, request_id: Optional[str] = None):
+        self.method = method
+        self.path = path
+        self.request_id = request_id
+        self.route: Optional[str] = None
+        self.status_code: Optional[int] = None
+        self.started_at = time.time()
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Dict[str, StatementStats] = {}
+
+    def record(self, statement: str, parameters: Any, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        stats = self.statements.get(statement)
+        if stats is None:
+            stats = self.statements[statement] = StatementStats()
+        stats.count += 1
+        stats.seconds += seconds
+        try:
+            stats.params.add(hash(repr(parameters)))
+        except TypeError:
+            pass
+
+    def repeated(self, threshold: int) -> List[Dict[str, Any]]:
+        """
+        执行次数达到阈值的语句
+
+        Args:
+            threshold: 次数阈值
+
+        Returns:
+            list: 按次数降序排列的语句统计；duplicates 为参数也完全相同的重复执行次数
+        """
+        items = [
+            {
+                "statement": statement[:STATEMENT_PREVIEW_LENGTH],
+                "count": stats.count,
+                "duplicates": stats.count - len(stats.params),
+                "time_ms": round(stats.seconds * 1000, 3),
+            }
+            for statement, stats in self.statements.items()
+            if stats.count >= threshold
+        ]
+        items.sort(key=lambda item: item["count"], reverse=True)
+        return items
+
+    def violations(self) -> List[str]:
+        """超出的预算项"""
+        result = []
+        if self.count > settings.SQL_PROFILER_MAX_QUERIES:
+            result.append("queries")
+        if self.seconds * 1000 > settings.SQL_PROFILER_MAX_DB_MS:
+            result.append("db_time")
+        if self.repeated(settings.SQL_PROFILER_REPEAT_THRESHOLD):
+            result.append("repeated")
+        return result
+
+    def header_value(self) -> str:
+        """X-SQL-Profile 响应头的值"""
+        repeated = len(self.repeated(settings.SQL_PROFILER_REPEAT_THRESHOLD))
+        return f"count={self.count}; time_ms={self.seconds * 1000:.3f}; repeated={repeated}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "count": self.count,
+            "time_ms": round(self.seconds * 1000, 3),
+            "violations": self.violations(),
+            "repeated": self.repeated(settings.SQL_PROFILER_REPEAT_THRESHOLD),
+            "statements": [
+                {
+                    "statement": statement[:STATEMENT_PREVIEW_LENGTH],
+                    "count": stats.count,
+                    "time_ms": round(stats.seconds * 1000, 3),
+                }
+                for statement, stats in self.statements.items()
+            ],
+        }
+
+
+class ProfileHistory:
+    """最近请求分析结果的环形缓冲（每个 worker 一份）"""
+
+    def __init__(self, maxlen: int):
+        self._items: Deque[RequestProfile] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._items.append(profile)
+
+    def recent(self, limit: int = 50, only_violations: bool = False) -> List[Dict[str, Any]]:
+        """
+        最近的分析结果（新的在前）
+
+        Args:
+            limit: 最多返回条数
+            only_violations: 只返回超出预算的请求
+
+        Returns:
+            list: 分析结果
+        """
+        with self._lock:
+            items = list(self._items)
+        result = []
+        for profile in reversed(items):
+            data = profile.to_dict()
+            if only_violations and not data["violations"]:
+                continue
+            result.append(data)
+            if len(result) >= limit:
+                break
+        return result
+
+
+# 全局分析结果缓冲
+profile_history = ProfileHistory(maxlen=settings.SQL_PROFILER_HISTORY)
+
+# 当前请求的分析结果（由 SQL 分析中间件设置）
+current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context._profiler_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    profile = current_profile.get()
+    start = getattr(context, "_profiler_start", None)
+    if profile is not None and start is not None:
+        profile.record(statement, parameters, time.perf_counter() - start)
+
+
+def attach_sql_profiler(engine: AsyncEngine) -> None:
+    """在引擎上注册 SQL 分析事件（仅在 SQL_PROFILER_ENABLED 时调用）"""
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
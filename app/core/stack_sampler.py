@@ -0,0 +1,227 @@
+"""
+慢请求采样分析模块
+后台线程按固定间隔对进行中的请求采集 Python 调用栈，
+耗时超过阈值的请求输出为火焰图可用的 collapsed stack 文件
+"""
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logging_config import LOG_DIR, logger
+from app.core.request_context import get_request_id
+
+# 一个栈帧：(文件名, 函数名, 行号)
+FrameKey = Tuple[str, str, int]
+
+# 单个调用栈的最大深度
+MAX_STACK_DEPTH = 128
+
+
+class RequestSamples:
+    """单个请求的采样结果"""
+
+    __slots__ = ("method", "path", "request_id", "task", "started_at", "stacks", "samples")
+
+    def __init__(
+        self,
+        method: str,
+        path: str,
+        task: Optional[asyncio.Task],
+        request_id: Optional[str] = None,
+    ):
+        self.method = method
+        self.path = path
+        self.request_id = request_id
+        self.task = task
+        self.started_at = time.time()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+def _frame_chain(frame) -> List[FrameKey]:
+    """线程当前栈，从最外层到最内层"""
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_name, frame.f_lineno))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_chain(task: asyncio.Task) -> List[FrameKey]:
+    """挂起中的任务沿 await 链展开的栈，从最外层到最内层"""
+    stack = []
+    coro = task.get_coro()
+    while coro is not None and len(stack) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_name, frame.f_lineno))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+def _format_frame(frame: FrameKey) -> str:
+    filename, name, lineno = frame
+    return f"{name} ({filename}:{lineno})".replace(";", ":")
+
+
+def collapse(stacks: Counter) -> str:
+    """
+    转换为 collapsed stack 格式（flamegraph.pl / speedscope 可直接读取）
+
+    每行为 "根帧;...;叶帧 次数"。
+    """
+    lines = [
+        ";".join(_format_frame(frame) for frame in stack) + f" {count}"
+        for stack, count in stacks.most_common()
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class StackSampler:
+    """
+    慢请求采样分析器
+
+    后台线程每隔 interval 秒采样一次：正在事件循环线程上执行的请求取线程
+    真实调用栈（CPU 时间），挂起等待的请求沿 await 链取协程栈并以
+    "[await]" 为根（等待数据库、bcrypt 等的时间）。请求结束时若耗时超过
+    threshold，则由后台线程把采样结果写入 directory，目录中最多保留
+    max_files 个文件，超出时删除最旧的。
+    """
+
+    def __init__(self, interval: float, threshold: float, directory: Path, max_files: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.directory = directory
+        self.max_files = max_files
+        self.dumps_written = 0
+        self._active: Dict[int, RequestSamples] = {}
+        self._pending: List[RequestSamples] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+    async def start(self) -> None:
+        """在事件循环中调用，记录循环线程并启动采样线程"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._write_pending()
+
+    def begin(self, method: str, path: str) -> RequestSamples:
+        """请求开始时登记（在请求所在的任务中调用）"""
+        entry = RequestSamples(method, path, asyncio.current_task(), get_request_id())
+        with self._lock:
+            self._active[id(entry)] = entry
+        return entry
+
+    def end(self, entry: RequestSamples, elapsed: float) -> None:
+        """请求结束时注销，超过阈值的交给采样线程写盘"""
+        with self._lock:
+            self._active.pop(id(entry), None)
+            if elapsed > self.threshold and entry.samples:
+                self._pending.append(entry)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+            if self._pending:
+                self._write_pending()
+
+    def _sample(self) -> None:
+        with self._lock:
+            entries = list(self._active.values())
+        if not entries:
+            return
+        running = asyncio.current_task(self._loop) if self._loop is not None else None
+        thread_frame = None
+        for entry in entries:
+            try:
+                if entry.task is not None and entry.task is running:
+                    if thread_frame is None:
+                        thread_frame = sys._current_frames().get(self._loop_thread_id)
+                    stack = tuple(_frame_chain(thread_frame))
+                elif entry.task is not None:
+                    stack = (("", "[await]", 0), *_await_chain(entry.task))
+                else:
+                    continue
+            except Exception:
+                # 采样与事件循环并发进行，栈在读取过程中变化时跳过本次采样
+                continue
+            entry.stacks[stack] += 1
+            entry.samples += 1
+
+    def _write_pending(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for entry in pending:
+            try:
+                path = self._dump(entry)
+            except OSError:
+                logger.exception(f"写入慢请求采样文件失败: {self.directory}")
+                continue
+            # 写盘在采样线程中进行，请求上下文不可用，显式带上请求 ID
+            logger.bind(
+                request_id=entry.request_id or "-", profile=str(path), samples=entry.samples,
+            ).info(
+                f"🔥 Slow request profile saved: {entry.method} {entry.path} → {path.name}"
+            )
+        self._prune()
+
+    def _dump(self, entry: RequestSamples) -> Path:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(entry.started_at))
+        millis = int(entry.started_at * 1000) % 1000
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", entry.path).strip("_")[:60] or "root"
+        request_id = re.sub(r"[^A-Za-z0-9-]+", "_", entry.request_id or str(os.getpid()))
+        path = self.directory / f"{stamp}.{millis:03d}-{request_id}-{entry.method}-{slug}.collapsed"
+        path.write_text(collapse(entry.stacks), encoding="utf-8")
+        self.dumps_written += 1
+        return path
+
+    def _prune(self) -> None:
+        files = sorted(self.directory.glob("*.collapsed"))
+        for old in files[:max(0, len(files) - self.max_files)]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "interval": self.interval,
+            "threshold": self.threshold,
+            "directory": str(self.directory),
+            "in_flight": len(self._active),
+            "dumps_written": self.dumps_written,
+        }
+
+
+# 全局慢请求采样分析器
+stack_sampler = StackSampler(
+    interval=settings.STACK_PROFILER_INTERVAL,
+    threshold=settings.STACK_PROFILER_THRESHOLD,
+    directory=LOG_DIR / "profiles",
+    max_files=settings.STACK_PROFILER_MAX_FILES,
+)
@@ -1,4 +1,4 @@
 # CRUD 操作模块
-from app.crud.user import user_crud
+from app.crud.user import user_crud, UserConflictError
 
-__all__ = ["user_crud"]
+__all__ = ["user_crud", "UserConflictError"]
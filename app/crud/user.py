@@ -2,18 +2,71 @@
 用户 CRUD 操作
 封装所有用户相关的数据库操作
 """
-from typing import Optional, List
-from sqlalchemy import select, func
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator, Optional, List, Sequence, Tuple
+from sqlalchemy import Row, insert, or_, select, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.cache import principal_cache, user_count
+from app.core.database import run_after_commit, use_primary
+from app.core.invalidation import invalidation_bus
 from app.models.user import User
-from app.schemas.user import UserCreate, UserUpdate
-from app.core.security import get_password_hash, verify_password
+from app.schemas.user import UserCreate, UserUpdate, UserImportError
+from app.core.security import hash_password_async, hash_passwords_async, verify_password_async
+
+
+# 导出时选取的列（不含密码哈希）
+EXPORT_COLUMNS = (
+    User.id,
+    User.email,
+    User.username,
+    User.full_name,
+    User.is_active,
+    User.is_superuser,
+    User.created_at,
+    User.updated_at,
+)
+
+
+# 批量导入时唯一字段冲突的提示
+IMPORT_CONFLICT_DETAILS = {
+    "email": "该邮箱已被注册",
+    "username": "该用户名已被使用",
+}
+
+
+def _page_query(query, skip: int, limit: int, after_id: Optional[int]):
+    """按 ID 排序分页：传入 after_id 时使用 keyset 分页，否则使用 offset 分页"""
+    query = query.order_by(User.id).limit(limit)
+    if after_id is not None:
+        return query.where(User.id > after_id)
+    return query.offset(skip)
+
+
+class UserConflictError(Exception):
+    """邮箱或用户名与已有用户冲突"""
+    
+    def __init__(self, field: str):
+        super().__init__(field)
+        self.field = field
 
 
 class UserCRUD:
     """用户 CRUD 操作类"""
     
+    def _invalidate(self, db: AsyncSession, *usernames: str) -> None:
+        """
+        失效用户相关缓存
+        
+        本 worker 立即失效；事务提交后再广播给所有 worker（含本 worker），
+        避免其他请求在提交前重新读到旧数据并写回缓存。
+        """
+        for username in set(usernames):
+            principal_cache.invalidate(username)
+            run_after_commit(db, lambda name=username: invalidation_bus.publish(f"user:{name}"))
+    
     async def get_by_id(self, db: AsyncSession, user_id: int) -> Optional[User]:
         """
         根据 ID 获取用户
@@ -56,30 +109,150 @@ class UserCRUD:
         result = await db.execute(select(User).where(User.username == username))
         return result.scalar_one_or_none()
     
+    async def find_conflict(
+        self, 
+        db: AsyncSession, 
+        email: Optional[str] = None, 
+        username: Optional[str] = None,
+        exclude_id: Optional[int] = None
+    ) -> Optional[str]:
+        """
+        用一次查询检查邮箱和用户名是否已被占用
+        
+        Args:
+            db: 数据库会话
+            email: 要检查的邮箱（None 表示不检查）
+            username: 要检查的用户名（None 表示不检查）
+            exclude_id: 排除的用户 ID（更新自己时使用）
+        
+        Returns:
+            str | None: 冲突字段（"email" 优先于 "username"），无冲突返回 None
+        """
+        conditions = []
+        if email:
+            conditions.append(User.email == email)
+        if username:
+            conditions.append(User.username == username)
+        if not conditions:
+            return None
+        
+        query = select(User.email, User.username).where(or_(*conditions)).limit(2)
+        if exclude_id is not None:
+            query = query.where(User.id != exclude_id)
+        rows = (await db.execute(query)).all()
+        
+        if email and any(row.email == email for row in rows):
+            return "email"
+        if username and any(row.username == username for row in rows):
+            return "username"
+        return None
+    
+    @asynccontextmanager
+    async def _conflict_savepoint(
+        self, 
+        db: AsyncSession, 
+        email: Optional[str], 
+        username: Optional[str],
+        exclude_id: Optional[int] = None
+    ) -> AsyncIterator[None]:
+        """
+        在 savepoint 中写入并 flush，把唯一索引冲突转换为 UserConflictError
+        
+        事先检查与写入之间可能有并发请求占用了同一邮箱/用户名，
+        此时依赖数据库唯一约束兜底：只回滚这个 savepoint（调用方事务中
+        其他已完成的修改保留），再查出冲突字段。
+        修改必须在 with 块内进行，进入 savepoint 前的待写入数据会先被 flush。
+        """
+        try:
+            async with db.begin_nested():
+                yield
+        except IntegrityError:
+            field = await self.find_conflict(db, email, username, exclude_id=exclude_id)
+            if field is None:
+                raise
+            raise UserConflictError(field)
+    
     async def get_list(
         self, 
         db: AsyncSession, 
         skip: int = 0, 
-        limit: int = 100
+        limit: int = 100,
+        after_id: Optional[int] = None
     ) -> List[User]:
         """
         获取用户列表（分页）
         
+        传入 after_id 时使用 keyset 分页：按主键定位到 after_id 之后，
+        不再扫描并丢弃前面的记录，翻页深度不影响查询耗时；此时忽略 skip。
+        
         Args:
             db: 数据库会话
-            skip: 跳过数量
+            skip: 跳过数量（offset 分页）
             limit: 返回数量限制
+            after_id: 上一页最后一条记录的 ID（keyset 分页）
         
         Returns:
             List[User]: 用户列表
         """
-        result = await db.execute(
-            select(User)
-            .offset(skip)
-            .limit(limit)
+        result = await db.execute(_page_query(select(User), skip, limit, after_id))
+        return list(result.scalars().all())
+    
+    async def get_page_fingerprint(
+        self,
+        db: AsyncSession,
+        skip: int = 0,
+        limit: int = 100,
+        after_id: Optional[int] = None
+    ) -> Tuple[int, Optional[int], int, Optional[datetime]]:
+        """
+        获取与 get_list 同一页的摘要（用于计算列表 ETag）
+        
+        只读取 id 与 updated_at 并在数据库中聚合，不加载 ORM 对象。
+        
+        Args:
+            db: 数据库会话
+            skip: 跳过数量（offset 分页）
+            limit: 返回数量限制
+            after_id: 上一页最后一条记录的 ID（keyset 分页）
+        
+        Returns:
+            tuple: (记录数, 最大 ID, ID 之和, 最大 updated_at)
+        """
+        page = _page_query(select(User.id, User.updated_at), skip, limit, after_id).subquery()
+        result = await db.execute(select(
+            func.count(),
+            func.max(page.c.id),
+            func.coalesce(func.sum(page.c.id), 0),
+            func.max(page.c.updated_at),
+        ))
+        count, max_id, id_sum, max_updated_at = result.one()
+        return count, max_id, int(id_sum), max_updated_at
+    
+    async def iter_export_rows(
+        self, 
+        db: AsyncSession, 
+        chunk_size: int = 1000
+    ) -> AsyncIterator[Sequence[Row]]:
+        """
+        分块流式读取全部用户（用于导出）
+        
+        使用服务端游标按块拉取，只选取需要的列，不构造 ORM 对象，
+        内存占用与用户总数无关。
+        
+        Args:
+            db: 数据库会话
+            chunk_size: 每块行数
+        
+        Yields:
+            Sequence[Row]: 一块用户数据行
+        """
+        result = await db.stream(
+            select(*EXPORT_COLUMNS)
             .order_by(User.id)
+            .execution_options(yield_per=chunk_size)
         )
-        return list(result.scalars().all())
+        async for rows in result.partitions(chunk_size):
+            yield rows
     
     async def get_count(self, db: AsyncSession) -> int:
         """
@@ -94,6 +267,21 @@ class UserCRUD:
         result = await db.execute(select(func.count(User.id)))
         return result.scalar_one()
     
+    async def get_cached_count(self, db: AsyncSession) -> int:
+        """
+        获取用户总数（快速路径）
+        
+        本 worker 的创建/删除在提交后增量维护计数，
+        其他 worker 的写入最多延迟 USER_COUNT_MAX_STALENESS 秒体现。
+        
+        Args:
+            db: 数据库会话
+        
+        Returns:
+            int: 用户总数（可能略有延迟）
+        """
+        return await user_count.get(lambda: self.get_count(db))
+    
     async def create(self, db: AsyncSession, user_in: UserCreate) -> User:
         """
         创建新用户
@@ -104,8 +292,11 @@ class UserCRUD:
         
         Returns:
             User: 创建的用户对象
+        
+        Raises:
+            UserConflictError: 邮箱或用户名已被占用
         """
-        hashed_password = get_password_hash(user_in.password)
+        hashed_password = await hash_password_async(user_in.password)
         
         db_user = User(
             email=user_in.email,
@@ -114,12 +305,125 @@ class UserCRUD:
             full_name=user_in.full_name
         )
         
-        db.add(db_user)
-        await db.flush()
-        await db.refresh(db_user)
+        # 主键通过 RETURNING/lastrowid 取回，其余列均为 Python 端默认值，
+        # flush 后已写回对象，无需再 refresh 查询一次（时间列由 UTCDateTime 统一为 UTC）
+        async with self._conflict_savepoint(db, user_in.email, user_in.username):
+            db.add(db_user)
+        self._invalidate(db, db_user.username)
+        run_after_commit(db, lambda: user_count.adjust(1))
         
         return db_user
     
+    async def bulk_create(
+        self, 
+        db: AsyncSession, 
+        rows: Sequence[Tuple[int, UserCreate]], 
+        batch_size: int = 500
+    ) -> Tuple[int, List[UserImportError]]:
+        """
+        批量创建用户
+        
+        分三步进行，耗时的密码哈希不在写事务中执行：
+        1. 按批用一次 IN 查询检查邮箱、一次检查用户名（只读，不加写锁）；
+        2. 计算所有通过检查的行的密码哈希（只占用部分计算池，见 hash_passwords_async）；
+        3. 按批在 savepoint 中以 executemany 插入。
+        检查之后有并发写入占用了邮箱或用户名时，只回滚这一批，
+        再逐行插入以找出真正冲突的行，其余行照常创建；与这些冲突行重复
+        而被暂缓的行随后再按同样流程导入一次。
+        不提交事务，由调用方（get_db）在请求结束时统一提交；
+        写锁从第一次插入持有到提交，只覆盖插入本身。
+        
+        Args:
+            db: 数据库会话
+            rows: (行号, 用户创建数据) 列表
+            batch_size: 每批行数
+        
+        Returns:
+            Tuple[int, List[UserImportError]]: 成功创建数与逐行错误
+        """
+        created = 0
+        errors: List[UserImportError] = []
+        seen_emails = set()
+        seen_usernames = set()
+        accepted: List[Tuple[int, UserCreate]] = []
+        # 与本次导入中靠前的行重复的行：(行号, 数据, 冲突字段)
+        duplicates: List[Tuple[int, UserCreate, str]] = []
+        
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            existing_emails = set((await db.scalars(
+                select(User.email).where(User.email.in_([user_in.email for _, user_in in batch]))
+            )).all())
+            existing_usernames = set((await db.scalars(
+                select(User.username).where(User.username.in_([user_in.username for _, user_in in batch]))
+            )).all())
+            
+            for row, user_in in batch:
+                if user_in.email in existing_emails:
+                    errors.append(UserImportError(row=row, field="email", detail=IMPORT_CONFLICT_DETAILS["email"]))
+                elif user_in.email in seen_emails:
+                    duplicates.append((row, user_in, "email"))
+                elif user_in.username in existing_usernames:
+                    errors.append(UserImportError(row=row, field="username", detail=IMPORT_CONFLICT_DETAILS["username"]))
+                elif user_in.username in seen_usernames:
+                    duplicates.append((row, user_in, "username"))
+                else:
+                    seen_emails.add(user_in.email)
+                    seen_usernames.add(user_in.username)
+                    accepted.append((row, user_in))
+        
+        hashed_passwords = await hash_passwords_async([user_in.password for _, user_in in accepted])
+        
+        for start in range(0, len(accepted), batch_size):
+            batch = accepted[start:start + batch_size]
+            values = [
+                {
+                    "email": user_in.email,
+                    "username": user_in.username,
+                    "hashed_password": hashed_password,
+                    "full_name": user_in.full_name,
+                }
+                for (_, user_in), hashed_password in zip(batch, hashed_passwords[start:start + batch_size])
+            ]
+            try:
+                async with db.begin_nested():
+                    await db.execute(insert(User), values)
+                created += len(batch)
+                continue
+            except IntegrityError:
+                pass
+            
+            # 检查之后有并发写入占用了邮箱或用户名：这一批未写入，逐行插入定位冲突行
+            for (row, user_in), row_values in zip(batch, values):
+                try:
+                    async with self._conflict_savepoint(db, user_in.email, user_in.username):
+                        await db.execute(insert(User), [row_values])
+                except UserConflictError as exc:
+                    errors.append(UserImportError(row=row, field=exc.field, detail=IMPORT_CONFLICT_DETAILS[exc.field]))
+                    seen_emails.discard(user_in.email)
+                    seen_usernames.discard(user_in.username)
+                    continue
+                created += 1
+        
+        if created:
+            run_after_commit(db, lambda count=created: user_count.adjust(count))
+        
+        # 重复的行中，与之重复的行已成功创建的记为冲突；与之重复的行因并发冲突
+        # 未能写入时重新导入（只在并发冲突时发生，行数很少，其哈希在写事务中计算）
+        seen = {"email": seen_emails, "username": seen_usernames}
+        retry: List[Tuple[int, UserCreate]] = []
+        for row, user_in, field in duplicates:
+            if getattr(user_in, field) in seen[field]:
+                errors.append(UserImportError(row=row, field=field, detail=IMPORT_CONFLICT_DETAILS[field]))
+            else:
+                retry.append((row, user_in))
+        if retry:
+            retried, retry_errors = await self.bulk_create(db, retry, batch_size)
+            created += retried
+            errors.extend(retry_errors)
+        errors.sort(key=lambda error: error.row)
+        return created, errors
+    
     async def update(
         self, 
         db: AsyncSession, 
@@ -136,18 +440,26 @@ class UserCRUD:
         
         Returns:
             User: 更新后的用户对象
+        
+        Raises:
+            UserConflictError: 新邮箱或新用户名已被占用
         """
         update_data = user_in.model_dump(exclude_unset=True)
+        old_username = db_user.username
         
         # 如果更新密码，需要哈希处理
         if "password" in update_data:
-            update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+            update_data["hashed_password"] = await hash_password_async(update_data.pop("password"))
         
-        for field, value in update_data.items():
-            setattr(db_user, field, value)
+        # updated_at 由 Python 端 onupdate 生成，flush 后已写回对象
+        async with self._conflict_savepoint(
+            db, update_data.get("email"), update_data.get("username"), exclude_id=db_user.id
+        ):
+            for field, value in update_data.items():
+                setattr(db_user, field, value)
         
-        await db.flush()
-        await db.refresh(db_user)
+        # 失效认证缓存，禁用/改名在所有 worker 上立即生效
+        self._invalidate(db, old_username, db_user.username)
         
         return db_user
     
@@ -164,6 +476,8 @@ class UserCRUD:
         """
         await db.delete(db_user)
         await db.flush()
+        self._invalidate(db, db_user.username)
+        run_after_commit(db, lambda: user_count.adjust(-1))
         return True
     
     async def authenticate(
@@ -183,6 +497,9 @@ class UserCRUD:
         Returns:
             User | None: 验证成功返回用户对象，失败返回 None
         """
+        # 从主库读取，刚修改的密码、刚禁用的账户立即生效
+        use_primary(db)
+        
         # 尝试通过用户名查找
         user = await self.get_by_username(db, username)
         
@@ -193,7 +510,7 @@ class UserCRUD:
         if not user:
             return None
         
-        if not verify_password(password, user.hashed_password):
+        if not await verify_password_async(password, user.hashed_password):
             return None
         
         return user
@@ -5,11 +5,23 @@ FastAPI 应用入口
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 from app.core.config import settings
 from app.core.database import init_db, close_db
-from app.core.logging_config import logger  # 导入日志
-from app.middleware import RequestLoggingMiddleware  # 导入日志中间件
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import metrics_exporter, registry
+from app.core.security import password_hash_pool
+from app.core.stack_sampler import stack_sampler
+from app.core.logging_config import logger, shutdown_logging  # 导入日志
+from app.middleware import (  # 导入日志、压缩、指标与 SQL 分析中间件
+    CompressionMiddleware,
+    MetricsMiddleware,
+    RequestLoggingMiddleware,
+    SQLProfilerMiddleware,
+    StackSamplingMiddleware,
+)
+from app.api.openapi import install_cached_openapi
 from app.api.v1.router import api_router
 
 
@@ -24,13 +36,22 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 正在初始化数据库...")
     await init_db()
     logger.success("✅ 数据库初始化完成")
+    await invalidation_bus.start()
+    await metrics_exporter.start()
+    if settings.STACK_PROFILER_ENABLED:
+        await stack_sampler.start()
     
     yield
     
     # 关闭时清理资源
+    await stack_sampler.stop()
+    await metrics_exporter.stop()
+    await invalidation_bus.stop()
     logger.info("👋 正在关闭数据库连接...")
     await close_db()
+    password_hash_pool.shutdown()
     logger.success("✅ 数据库连接已关闭")
+    shutdown_logging()
 
 
 
@@ -59,9 +80,9 @@ app = FastAPI(
 - bcrypt 密码哈希
 - 基于角色的权限控制
     """,
-    docs_url="/docs",
-    redoc_url="/redoc",
-    openapi_url="/openapi.json",
+    docs_url="/docs" if settings.DOCS_ENABLED else None,
+    redoc_url="/redoc" if settings.DOCS_ENABLED else None,
+    openapi_url="/openapi.json" if settings.DOCS_ENABLED else None,
     lifespan=lifespan
 )
 
@@ -72,11 +93,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "ETag", "X-Next-Cursor", "X-Total-Count", "X-SQL-Profile"],
 )
 
+# 配置慢请求采样中间件
+if settings.STACK_PROFILER_ENABLED:
+    app.add_middleware(StackSamplingMiddleware)
+
+# 配置 SQL 分析中间件（排查 N+1 查询时开启）
+if settings.SQL_PROFILER_ENABLED:
+    app.add_middleware(SQLProfilerMiddleware)
+
+# 配置指标中间件
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# 配置响应压缩中间件
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# 配置请求日志中间件（最后添加的位于最外层，计时包含其他中间件）
+app.add_middleware(RequestLoggingMiddleware)
+
 # 注册 API 路由
 app.include_router(api_router, prefix="/api/v1")
 
+# /openapi.json 只生成一次，之后返回缓存的预压缩版本（配置了 OPENAPI_FILE 时直接发送预生成的文件）
+if settings.DOCS_ENABLED:
+    install_cached_openapi(app, settings.OPENAPI_FILE)
+
 
 @app.get("/", tags=["🏠 根路径"])
 async def root():
@@ -87,8 +132,8 @@ async def root():
     return {
         "message": "欢迎使用用户管理 API",
         "version": settings.APP_VERSION,
-        "docs": "/docs",
-        "redoc": "/redoc"
+        "docs": app.docs_url,
+        "redoc": app.redoc_url
     }
 
 
@@ -103,3 +148,16 @@ async def health_check():
         "app_name": settings.APP_NAME,
         "version": settings.APP_VERSION
     }
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        """
+        Prometheus 指标端点
+        配置了 METRICS_MULTIPROC_DIR 时返回所有 worker 汇总后的指标
+        """
+        return PlainTextResponse(
+            registry.render(settings.METRICS_MULTIPROC_DIR),
+            media_type="text/plain; version=0.0.4; charset=utf-8",
+        )
@@ -1,7 +1,16 @@
 # 中间件模块
-from app.middleware.logging import RequestLoggingMiddleware, APIAccessLogger
+from app.middleware.logging import RequestLoggingMiddleware, APIAccessLogger, access_log_stats
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.metrics import MetricsMiddleware
+from app.middleware.sql_profiler import SQLProfilerMiddleware
+from app.middleware.profiling import StackSamplingMiddleware
 
 __all__ = [
     "RequestLoggingMiddleware",
     "APIAccessLogger",
+    "access_log_stats",
+    "CompressionMiddleware",
+    "MetricsMiddleware",
+    "SQLProfilerMiddleware",
+    "StackSamplingMiddleware",
 ]
@@ -0,0 +1,150 @@
+"""
+响应压缩中间件
+按 Accept-Encoding 选择 zstd / br / gzip 压缩响应体，支持流式响应
+"""
+from typing import Dict, Iterable, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.compression import Compressor, compress, configured_encodings, configured_levels, select_encoding
+from app.core.config import settings
+
+# 可压缩的内容类型（其余类型如图片、压缩包原样发送）
+COMPRESSIBLE_TYPES = frozenset({
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "application/xml",
+    "image/svg+xml",
+})
+
+# 不带响应体或不能改写响应体的状态码
+_SKIP_STATUS = frozenset({204, 206, 304})
+
+
+def _is_compressible(content_type: str) -> bool:
+    media_type = content_type.partition(";")[0].strip().lower()
+    if media_type in COMPRESSIBLE_TYPES:
+        return True
+    if media_type.endswith(("+json", "+xml")):
+        return True
+    return media_type.startswith("text/") and media_type != "text/event-stream"
+
+
+def _weaken_etag(headers: MutableHeaders) -> None:
+    """压缩后字节不同，强 ETag 改为弱 ETag"""
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = "W/" + etag
+
+
+class CompressionMiddleware:
+    """
+    响应压缩中间件（纯 ASGI 实现）
+
+    - 完整响应：小于 minimum_size 的不压缩，压缩后没有变小的按原样发送
+    - 流式响应：每个分块压缩后立即 flush 发送，不等待整个响应体
+    - 已设置 Content-Encoding 的响应（如预压缩的 /openapi.json）原样发送
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: Optional[int] = None,
+        encodings: Optional[Iterable[str]] = None,
+        levels: Optional[Dict[str, int]] = None,
+    ):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+        self.encodings = tuple(configured_encodings() if encodings is None else encodings)
+        self.levels = configured_levels() if levels is None else levels
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoding = select_encoding(value.decode("latin-1"), self.encodings)
+                break
+
+        start_message: Optional[Message] = None
+        compressor: Optional[Compressor] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, compressor, passthrough
+            message_type = message["type"]
+
+            if message_type == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    message["status"] in _SKIP_STATUS
+                    or "content-encoding" in headers
+                    or not _is_compressible(headers.get("content-type", ""))
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # 等到第一个响应体分块再决定是否压缩
+                    start_message = message
+                return
+
+            if passthrough or message_type != "http.response.body":
+                if start_message is not None:
+                    await send(start_message)
+                    start_message = None
+                passthrough = True
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is not None:
+                # 流式响应的后续分块
+                chunk = compressor.compress(body) if body else b""
+                if not more_body:
+                    chunk += compressor.finish()
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            if not more_body:
+                # 完整响应
+                if len(body) >= self.minimum_size:
+                    headers.add_vary_header("Accept-Encoding")
+                    if encoding is not None:
+                        compressed = compress(body, encoding, self.levels[encoding])
+                        if len(compressed) < len(body):
+                            headers["Content-Encoding"] = encoding
+                            headers["Content-Length"] = str(len(compressed))
+                            _weaken_etag(headers)
+                            message = {**message, "body": compressed}
+                await send(start_message)
+                start_message = None
+                passthrough = True
+                await send(message)
+                return
+
+            # 流式响应的第一个分块
+            headers.add_vary_header("Accept-Encoding")
+            if encoding is None:
+                await send(start_message)
+                start_message = None
+                passthrough = True
+                await send(message)
+                return
+            compressor = Compressor(encoding, self.levels[encoding])
+            headers["Content-Encoding"] = encoding
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            _weaken_etag(headers)
+            await send(start_message)
+            start_message = None
+            await send({"type": "http.response.body", "body": compressor.compress(body), "more_body": True})
+
+        await self.app(scope, receive, send_wrapper)
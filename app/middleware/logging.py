@@ -2,116 +2,208 @@
 请求日志中间件
 记录每个 API 请求的详细信息
 """
+import random
 import time
-import json
-from typing import Callable
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from typing import Any, Dict, Iterable, Optional
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from app.core.config import settings
 from app.core.logging_config import logger
+from app.core.request_context import RequestContext, context_from_headers, current_request
+from app.middleware.metrics import route_template
 
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
+class AccessLogStats:
     """
-    请求日志中间件
-    记录所有 HTTP 请求的详细信息
+    访问日志计数（每个 worker 进程一份）
+
+    所有请求都会计数，包括被采样跳过的请求，
+    因此可以据此还原真实的请求量和错误率。
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.logged = 0
+        self.sampled_out = 0
+        self.slow = 0
+        self.by_status_class: Dict[str, int] = {}
+
+    def record(self, status_code: int, logged: bool, slow: bool) -> None:
+        self.requests += 1
+        status_class = f"{status_code // 100}xx"
+        self.by_status_class[status_class] = self.by_status_class.get(status_class, 0) + 1
+        if slow:
+            self.slow += 1
+        if logged:
+            self.logged += 1
+        else:
+            self.sampled_out += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "logged": self.logged,
+            "sampled_out": self.sampled_out,
+            "slow": self.slow,
+            "by_status_class": dict(self.by_status_class),
+        }
+
+
+# 全局访问日志计数
+access_log_stats = AccessLogStats()
+
+
+class RequestLoggingMiddleware:
     """
+    请求日志中间件（纯 ASGI 实现）
+    
+    只包装 send 以获取状态码并注入响应头，不缓冲响应体，
+    因此对流式响应透明；每个请求在结束时输出一条结构化日志。
     
-    def __init__(self, app: ASGIApp):
-        super().__init__(app)
+    成功请求按 sample_rate 采样记录，exclude_paths 中的路径不记录成功请求；
+    4xx/5xx 与慢请求始终记录。
+    
+    请求 ID 沿用上游的 X-Request-ID（trust_request_id 开启时）或新生成，
+    连同 traceparent 中的 trace_id 放入 current_request，请求内的所有日志自动带上。
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        sample_rate: Optional[float] = None,
+        slow_threshold: Optional[float] = None,
+        exclude_paths: Optional[Iterable[str]] = None,
+        trust_request_id: Optional[bool] = None,
+    ):
+        self.app = app
+        self.sample_rate = settings.ACCESS_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.slow_threshold = (
+            settings.ACCESS_LOG_SLOW_THRESHOLD if slow_threshold is None else slow_threshold
+        )
+        self.exclude_paths = frozenset(
+            settings.access_log_exclude_paths if exclude_paths is None else exclude_paths
+        )
+        self.trust_request_id = (
+            settings.TRUST_REQUEST_ID_HEADER if trust_request_id is None else trust_request_id
+        )
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
         """
         处理请求并记录日志
         """
-        # 请求开始时间
-        start_time = time.time()
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # 生成请求 ID
-        request_id = f"{int(start_time * 1000)}"
+        # 请求开始时间
+        start = time.perf_counter()
         
-        # 提取请求信息
-        client_ip = request.client.host if request.client else "unknown"
-        method = request.method
-        path = request.url.path
-        query_params = dict(request.query_params)
+        # 生成或沿用请求 ID
+        context = context_from_headers(scope["headers"], self.trust_request_id)
+        request_id = context.request_id
+        token = current_request.set(context)
+        status_code = 500
         
-        # 获取用户信息（如果已认证）
-        user_info = "anonymous"
-        if hasattr(request.state, "user"):
-            user = request.state.user
-            user_info = getattr(user, "username", "unknown")
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # 添加响应头
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Request-ID", request_id)
+                headers.append("X-Process-Time", f"{time.perf_counter() - start:.3f}")
+            await send(message)
         
-        # 记录请求开始
-        logger.info(
-            f"📨 Incoming: {method} {path}",
-            extra={
-                "request_id": request_id,
-                "method": method,
-                "path": path,
-                "query_params": query_params,
-                "client_ip": client_ip,
-                "user": user_info,
-                "user_agent": request.headers.get("user-agent", ""),
-            }
-        )
-        
-        # 处理请求
         try:
-            response = await call_next(request)
-            
-            # 计算处理时间
-            process_time = time.time() - start_time
-            
-            # 记录响应
-            log_data = {
-                "request_id": request_id,
-                "method": method,
-                "path": path,
-                "status_code": response.status_code,
-                "process_time": f"{process_time:.3f}s",
-                "client_ip": client_ip,
-                "user": user_info,
-            }
-            
-            # 根据状态码选择日志级别
-            if response.status_code >= 500:
-                logger.error(f"❌ {method} {path} → {response.status_code}", extra=log_data)
-            elif response.status_code >= 400:
-                logger.warning(f"⚠️  {method} {path} → {response.status_code}", extra=log_data)
-            else:
-                logger.info(f"✅ {method} {path} → {response.status_code}", extra=log_data)
-            
-            # 慢查询警告
-            if process_time > 1.0:
-                logger.warning(
-                    f"🐌 Slow request: {method} {path} took {process_time:.3f}s",
-                    extra=log_data
-                )
-            
-            # 添加响应头
-            response.headers["X-Request-ID"] = request_id
-            response.headers["X-Process-Time"] = f"{process_time:.3f}"
-            
-            return response
-            
+            await self.app(scope, receive, send_wrapper)
         except Exception as e:
-            # 记录异常
-            process_time = time.time() - start_time
-            logger.exception(
-                f"💥 Error: {method} {path}",
-                extra={
-                    "request_id": request_id,
-                    "method": method,
-                    "path": path,
-                    "client_ip": client_ip,
-                    "user": user_info,
-                    "process_time": f"{process_time:.3f}s",
-                    "error": str(e),
-                }
-            )
+            # 记录异常（未处理的异常同样计入访问日志计数）
+            process_time = time.perf_counter() - start
+            access_log_stats.record(status_code, True, process_time > self.slow_threshold)
+            logger.bind(
+                **_request_fields(scope, context),
+                process_time=f"{process_time:.3f}s",
+                error=str(e),
+            ).opt(exception=True).error(f"💥 Error: {scope['method']} {scope['path']}")
             raise
+        finally:
+            current_request.reset(token)
+        
+        process_time = time.perf_counter() - start
+        slow = process_time > self.slow_threshold
+        if status_code >= 400 or slow:
+            sample_rate = 1.0
+        elif scope["path"] in self.exclude_paths:
+            sample_rate = 0.0
+        else:
+            sample_rate = self.sample_rate
+        logged = sample_rate >= 1.0 or random.random() < sample_rate
+        access_log_stats.record(status_code, logged, slow)
+        if logged:
+            _log_response(scope, context, status_code, process_time, slow, sample_rate)
+
+
+def _request_fields(scope: Scope, context: RequestContext) -> dict:
+    """从 ASGI scope 提取请求信息"""
+    client = scope.get("client")
+    user_agent = ""
+    for name, value in scope["headers"]:
+        if name == b"user-agent":
+            user_agent = value.decode("latin-1")
+            break
+    
+    # 获取用户信息（如果已认证）
+    user = scope.get("state", {}).get("user")
+    
+    fields = {
+        "request_id": context.request_id,
+        "method": scope["method"],
+        "path": scope["path"],
+        "route": route_template(scope),
+        "query_string": scope["query_string"].decode("latin-1"),
+        "client_ip": client[0] if client else "unknown",
+        "user": getattr(user, "username", "anonymous"),
+        "user_agent": user_agent,
+    }
+    if context.trace_id is not None:
+        fields["trace_id"] = context.trace_id
+        fields["parent_span_id"] = context.parent_id
+    return fields
+
+
+def _log_response(
+    scope: Scope,
+    context: RequestContext,
+    status_code: int,
+    process_time: float,
+    slow: bool,
+    sample_rate: float,
+) -> None:
+    """
+    输出单条请求日志，根据状态码和耗时选择日志级别
+    
+    sample_rate 随日志一起输出，统计时每条日志按 1 / sample_rate 条请求计。
+    """
+    method = scope["method"]
+    path = scope["path"]
+    record = logger.bind(
+        **_request_fields(scope, context),
+        status_code=status_code,
+        process_time=f"{process_time:.3f}s",
+        duration_ms=round(process_time * 1000, 3),
+        sample_rate=sample_rate,
+    )
+    
+    if status_code >= 500:
+        record.error(f"❌ {method} {path} → {status_code}")
+    elif slow:
+        # 慢请求警告
+        record.warning(f"🐌 Slow request: {method} {path} took {process_time:.3f}s → {status_code}")
+    elif status_code >= 400:
+        record.warning(f"⚠️  {method} {path} → {status_code}")
+    else:
+        record.info(f"✅ {method} {path} → {status_code}")
 
 
 class APIAccessLogger:
@@ -172,7 +264,8 @@ class APIAccessLogger:
             "timestamp": time.time(),
         }
         
+        record = logger.bind(**log_data)
         if severity in ["HIGH", "CRITICAL"]:
-            logger.error(f"🚨 Security Event: {event_type}", extra=log_data)
+            record.error(f"🚨 Security Event: {event_type}")
         else:
-            logger.warning(f"⚠️  Security Event: {event_type}", extra=log_data)
+            record.warning(f"⚠️  Security Event: {event_type}")
@@ -0,0 +1,74 @@
+"""
+指标中间件
+按路由模板、方法和状态码统计请求数、耗时以及每个请求的 SQL 条数与耗时
+"""
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import (
+    QueryStats,
+    current_query_stats,
+    http_request_db_queries,
+    http_request_db_seconds,
+    http_request_duration_seconds,
+    http_requests_total,
+)
+
+# 未匹配任何路由的请求统一归到这个标签，避免任意路径导致标签基数爆炸
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class MetricsMiddleware:
+    """
+    指标中间件（纯 ASGI 实现）
+    
+    路由标签取自路由匹配后写入 scope 的路由模板（如 /api/v1/users/{user_id}），
+    而不是原始路径。
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        status_code = 500
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_stats.reset(token)
+            elapsed = time.perf_counter() - start
+            route_path = route_template(scope)
+            method = scope["method"]
+            labels = (method, route_path, str(status_code))
+            http_requests_total.inc(labels)
+            http_request_duration_seconds.observe(elapsed, labels)
+            http_request_db_queries.observe(stats.count, (method, route_path))
+            http_request_db_seconds.observe(stats.seconds, (method, route_path))
+
+
+def route_template(scope: Scope) -> str:
+    """
+    获取匹配到的完整路由模板
+    
+    较新的 FastAPI 在 include_router 时保留子路由的相对路径，
+    完整模板记录在 scope["fastapi"] 的 effective_route_context 中；
+    旧版本会把前缀拼进路由对象，直接取 route.path 即可。
+    """
+    context = scope.get("fastapi", {}).get("effective_route_context")
+    path = getattr(context, "path_format", None)
+    if path:
+        return path
+    return getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
@@ -0,0 +1,31 @@
+"""
+慢请求采样中间件
+在请求开始和结束时向采样分析器登记/注销当前请求
+"""
+import time
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.stack_sampler import stack_sampler
+
+
+class StackSamplingMiddleware:
+    """
+    慢请求采样中间件（纯 ASGI 实现，仅在 STACK_PROFILER_ENABLED 时注册）
+    
+    采样本身在后台线程中进行，这里只做登记，请求路径上的开销是常数级的。
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        entry = stack_sampler.begin(scope["method"], scope["path"])
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            stack_sampler.end(entry, time.perf_counter() - start)
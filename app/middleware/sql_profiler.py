@@ -0,0 +1,67 @@
+"""
+SQL 分析中间件
+为每个请求建立分析上下文，在响应头中返回摘要，超出预算时输出告警
+"""
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.logging_config import logger
+from app.core.request_context import get_request_id
+from app.core.sql_profiler import RequestProfile, current_profile, profile_history
+from app.middleware.metrics import route_template
+
+
+class SQLProfilerMiddleware:
+    """
+    SQL 分析中间件（纯 ASGI 实现，仅在 SQL_PROFILER_ENABLED 时注册）
+    
+    响应头在 http.response.start 时发出，此时普通端点的查询都已执行完毕；
+    流式响应在发送响应体期间执行的查询只计入日志和调试接口。
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        profile = RequestProfile(scope["method"], scope["path"], get_request_id())
+        token = current_profile.set(profile)
+        
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                profile.status_code = message["status"]
+                if settings.SQL_PROFILER_HEADER:
+                    MutableHeaders(scope=message).append("X-SQL-Profile", profile.header_value())
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_profile.reset(token)
+            profile.route = route_template(scope)
+            profile_history.add(profile)
+            _warn_if_over_budget(profile)
+
+
+def _warn_if_over_budget(profile: RequestProfile) -> None:
+    """请求超出语句数、耗时预算或存在重复语句时输出告警"""
+    violations = profile.violations()
+    if not violations:
+        return
+    repeated = profile.repeated(settings.SQL_PROFILER_REPEAT_THRESHOLD)
+    logger.bind(
+        method=profile.method,
+        path=profile.path,
+        route=profile.route,
+        sql_count=profile.count,
+        sql_time_ms=round(profile.seconds * 1000, 3),
+        violations=violations,
+        repeated=repeated[:3],
+    ).warning(
+        f"🧮 SQL budget exceeded: {profile.method} {profile.path} "
+        f"ran {profile.count} statements in {profile.seconds * 1000:.1f}ms ({', '.join(violations)})"
+    )
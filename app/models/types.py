@@ -0,0 +1,33 @@
+"""
+自定义列类型
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import DateTime
+from sqlalchemy.types import TypeDecorator
+
+
+class UTCDateTime(TypeDecorator):
+    """
+    始终返回带时区（UTC）时间的 DateTime
+
+    SQLite、MySQL 不保存时区，读出的是不带时区的时间；PostgreSQL 按会话时区返回。
+    写入时统一转换为 UTC，读出时统一附加 UTC 时区，
+    因此刚创建的对象与从数据库加载的对象序列化结果一致。
+    """
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[datetime], dialect) -> Optional[datetime]:
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        return value
+
+    def process_result_value(self, value: Optional[datetime], dialect) -> Optional[datetime]:
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
@@ -3,10 +3,11 @@
 SQLAlchemy ORM 模型定义
 """
 from datetime import datetime, timezone
-from sqlalchemy import String, Boolean, DateTime, Integer
+from sqlalchemy import String, Boolean, Integer
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.core.database import Base
+from app.models.types import UTCDateTime
 
 
 class User(Base):
@@ -59,13 +60,13 @@ class User(Base):
     
     # 时间戳
     created_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True),
+        UTCDateTime(),
         default=lambda: datetime.now(timezone.utc),
         nullable=False,
         comment="创建时间"
     )
     updated_at: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True),
+        UTCDateTime(),
         default=lambda: datetime.now(timezone.utc),
         onupdate=lambda: datetime.now(timezone.utc),
         nullable=False,
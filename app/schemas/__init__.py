@@ -3,7 +3,10 @@ from app.schemas.user import (
     UserCreate,
     UserUpdate,
     UserResponse,
-    UserInDB
+    UserInDB,
+    Principal,
+    UserImportError,
+    UserImportResult
 )
 from app.schemas.token import Token, TokenPayload
 
@@ -12,6 +15,9 @@ __all__ = [
     "UserUpdate", 
     "UserResponse",
     "UserInDB",
+    "Principal",
+    "UserImportError",
+    "UserImportResult",
     "Token",
     "TokenPayload"
 ]
@@ -3,7 +3,7 @@
 用于请求/响应数据验证和序列化
 """
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, EmailStr, Field, ConfigDict
 
 
@@ -65,6 +65,40 @@ class UserResponse(UserBase):
     updated_at: datetime = Field(..., description="更新时间")
 
 
+class Principal(BaseModel):
+    """
+    当前认证用户（只读）
+    
+    缓存在进程内并在请求间共享，因此不可修改，也不包含密码哈希；
+    需要修改当前用户的端点应按 id 重新加载 ORM 对象。
+    """
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+    
+    id: int
+    email: str
+    username: str
+    full_name: Optional[str] = None
+    is_active: bool
+    is_superuser: bool
+    created_at: datetime
+    updated_at: datetime
+
+
 class UserInDB(UserResponse):
     """数据库用户模式（包含哈希密码）"""
     hashed_password: str
+
+
+class UserImportError(BaseModel):
+    """批量导入单行错误"""
+    row: int = Field(..., description="行号（从 1 开始）")
+    field: Optional[str] = Field(None, description="出错字段")
+    detail: str = Field(..., description="错误描述")
+
+
+class UserImportResult(BaseModel):
+    """批量导入结果"""
+    total: int = Field(..., description="提交的总行数")
+    created: int = Field(..., description="成功创建的用户数")
+    failed: int = Field(..., description="失败行数")
+    errors: List[UserImportError] = Field(default_factory=list, description="逐行错误报告")
@@ -0,0 +1,41 @@
+"""
+JWT 解码基准测试
+对比冷解码（完整签名校验）与热解码（缓存命中）的吞吐量
+
+运行: python -m benchmarks.jwt_decode
+"""
+import time
+
+from app.core.security import create_access_token, decode_access_token, token_cache
+
+ITERATIONS = 20000
+
+
+def bench(label: str, func) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        func()
+    elapsed = time.perf_counter() - start
+    rate = ITERATIONS / elapsed
+    print(f"{label:<28} {rate:>12,.0f} ops/s  {elapsed / ITERATIONS * 1e6:8.2f} µs/op")
+    return rate
+
+
+def main():
+    token = create_access_token({"sub": "benchmark"})
+
+    def cold():
+        token_cache.clear()
+        decode_access_token(token)
+
+    def warm():
+        decode_access_token(token)
+
+    cold_rate = bench("cold (jose.jwt.decode)", cold)
+    decode_access_token(token)
+    warm_rate = bench("warm (cache hit)", warm)
+    print(f"speedup: {warm_rate / cold_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+请求日志中间件基准测试
+对比旧的 BaseHTTPMiddleware 实现与纯 ASGI 实现的每秒请求数
+
+运行: python -m benchmarks.middleware_rps [请求数]
+"""
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.core.logging_config import logger
+from app.middleware.logging import RequestLoggingMiddleware
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    """改造前的实现：两条日志 + BaseHTTPMiddleware"""
+
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        request_id = f"{int(start_time * 1000)}"
+        client_ip = request.client.host if request.client else "unknown"
+        method = request.method
+        path = request.url.path
+        logger.info(f"📨 Incoming: {method} {path}", extra={
+            "request_id": request_id, "method": method, "path": path,
+            "query_params": dict(request.query_params), "client_ip": client_ip,
+            "user": "anonymous", "user_agent": request.headers.get("user-agent", ""),
+        })
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        logger.info(f"✅ {method} {path} → {response.status_code}", extra={
+            "request_id": request_id, "method": method, "path": path,
+            "status_code": response.status_code, "process_time": f"{process_time:.3f}s",
+            "client_ip": client_ip, "user": "anonymous",
+        })
+        response.headers["X-Request-ID"] = request_id
+        response.headers["X-Process-Time"] = f"{process_time:.3f}"
+        return response
+
+
+def build_app(middleware) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    app.add_middleware(middleware)
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(200):
+            await client.get("/ping")
+        start = time.perf_counter()
+        for _ in range(requests):
+            await client.get("/ping")
+        return requests / (time.perf_counter() - start)
+
+
+async def main(requests: int) -> None:
+    # 日志写入 /dev/null：保留格式化和序列化开销，排除磁盘差异
+    logger.remove()
+    logger.add(os.devnull, level="INFO", serialize=True)
+
+    before = await measure(build_app(LegacyRequestLoggingMiddleware), requests)
+    after = await measure(build_app(RequestLoggingMiddleware), requests)
+    print(f"{'BaseHTTPMiddleware':<22} {before:>10,.0f} req/s")
+    print(f"{'pure ASGI':<22} {after:>10,.0f} req/s")
+    print(f"speedup: {after / before:.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,85 @@
+"""
+请求 ID 基准测试
+对比毫秒时间戳、uuid4 与 worker 前缀 + 计数三种请求 ID 的生成开销，
+以及日志 patcher 读取请求上下文的开销和时间戳方案在并发下的冲突率
+
+运行: python -m benchmarks.request_id [次数]
+"""
+import os
+import random
+import sys
+import time
+import timeit
+import uuid
+
+from app.core.logging_config import _add_request_context, logger
+from app.core.request_context import (
+    RequestContext,
+    context_from_headers,
+    current_request,
+    new_request_id,
+)
+
+
+def timestamp_id() -> str:
+    """改造前的实现"""
+    return f"{int(time.time() * 1000)}"
+
+
+def uuid_id() -> str:
+    return uuid.uuid4().hex
+
+
+def per_call_ns(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+
+def timestamp_collisions(rps: int, seconds: int) -> float:
+    """
+    请求以 rps 的速率随机到达（不论落在哪个 worker），
+    返回毫秒时间戳 ID 与之前某个请求重复的比例
+    """
+    arrivals = [int(random.uniform(0, seconds) * 1000) for _ in range(rps * seconds)]
+    return 1 - len(set(arrivals)) / len(arrivals)
+
+
+def main(number: int) -> None:
+    logger.remove()
+    logger.add(os.devnull, level="INFO", format="{extra[request_id]} {message}")
+
+    print(f"{'生成方式':<24} {'ns/次':>8}")
+    for name, func in [
+        ("毫秒时间戳（改造前）", timestamp_id),
+        ("uuid4", uuid_id),
+        ("worker 前缀 + 计数", new_request_id),
+    ]:
+        print(f"{name:<24} {per_call_ns(func, number):>8.0f}")
+
+    headers = [(b"host", b"bench"), (b"user-agent", b"bench"), (b"accept", b"*/*")]
+    traced = headers + [(b"traceparent", b"00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")]
+    print()
+    print(f"{'请求上下文':<24} {'ns/次':>8}")
+    print(f"{'context_from_headers':<24} {per_call_ns(lambda: context_from_headers(headers), number):>8.0f}")
+    print(f"{'  带 traceparent':<24} {per_call_ns(lambda: context_from_headers(traced), number):>8.0f}")
+
+    record = {"extra": {}}
+
+    def patch():
+        record["extra"] = {}
+        _add_request_context(record)
+
+    token = current_request.set(RequestContext(new_request_id()))
+    print(f"{'日志 patcher':<24} {per_call_ns(patch, number):>8.0f}")
+    print(f"{'logger.info（含 patcher）':<24} {per_call_ns(lambda: logger.info('bench'), number // 10):>8.0f}")
+    current_request.reset(token)
+
+    print()
+    for rps in (100, 500, 2000):
+        rate = timestamp_collisions(rps, seconds=60)
+        print(f"毫秒时间戳 ID 在 {rps} req/s 时的重复率: {rate:.1%}")
+    ids = [new_request_id() for _ in range(number)]
+    print(f"worker 前缀 + 计数生成 {number} 个 ID 的重复数: {len(ids) - len(set(ids))}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,94 @@
+"""
+SQLite 多写者基准测试
+模拟多个 gunicorn worker 同时读写同一个 SQLite 文件，
+对比默认配置与 SQLITE_TUNING 模式下的写吞吐量和 database is locked 错误数
+
+两种模式使用相同的锁等待时间（默认 100ms），只比较日志模式和 pragma 的差异。
+
+运行: python -m benchmarks.sqlite_writers [进程数] [每进程事务数] [锁等待毫秒]
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+async def worker(worker_id: int, transactions: int, start_at: float) -> dict:
+    from sqlalchemy import func, insert, select
+    from sqlalchemy.exc import OperationalError
+
+    from app.core.database import async_session_maker, engine
+    from app.models.user import User
+
+    committed = 0
+    locked = 0
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+    start = time.perf_counter()
+    for i in range(transactions):
+        try:
+            async with async_session_maker() as db:
+                # 读写混合：同一事务内先读再写，模拟真实请求
+                await db.execute(select(func.count(User.id)))
+                await db.execute(insert(User).values(
+                    email=f"w{worker_id}-{i}@example.com",
+                    username=f"w{worker_id}-{i}",
+                    hashed_password="x",
+                ))
+                await db.commit()
+            committed += 1
+        except OperationalError as exc:
+            if "locked" not in str(exc):
+                raise
+            locked += 1
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return {"committed": committed, "locked": locked, "elapsed": elapsed}
+
+
+def run(processes: int, transactions: int, busy_timeout_ms: int, tuning: bool) -> None:
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_writers.db")
+    if tuning:
+        url = f"sqlite+aiosqlite:///{db_path}"
+    else:
+        # 默认模式通过驱动的 timeout 参数设置相同的锁等待时间
+        url = f"sqlite+aiosqlite:///{db_path}?timeout={busy_timeout_ms / 1000}"
+    env = dict(
+        os.environ,
+        DATABASE_URL=url,
+        SQLITE_TUNING=str(tuning),
+        SQLITE_BUSY_TIMEOUT_MS=str(busy_timeout_ms),
+    )
+    subprocess.run(
+        [sys.executable, "-c", "import asyncio, app.models; from app.core.database import init_db; asyncio.run(init_db())"],
+        env=env, check=True,
+    )
+    # 所有进程导入完成后同时开始
+    start_at = time.time() + 3
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.sqlite_writers", "--worker", str(n), str(transactions), str(start_at)],
+            env=env, stdout=subprocess.PIPE,
+        )
+        for n in range(processes)
+    ]
+    results = [json.loads(proc.communicate()[0].decode().strip().splitlines()[-1]) for proc in procs]
+    committed = sum(r["committed"] for r in results)
+    locked = sum(r["locked"] for r in results)
+    elapsed = max(r["elapsed"] for r in results)
+    label = "SQLITE_TUNING=True" if tuning else "default"
+    print(f"{label:<20} committed={committed:>6} locked={locked:>6} {committed / elapsed:>10,.0f} writes/s")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        result = asyncio.run(worker(int(sys.argv[2]), int(sys.argv[3]), float(sys.argv[4])))
+        print(json.dumps(result))
+    else:
+        processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+        transactions = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+        busy_timeout_ms = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+        run(processes, transactions, busy_timeout_ms, tuning=False)
+        run(processes, transactions, busy_timeout_ms, tuning=True)
@@ -0,0 +1,101 @@
+"""
+启动耗时基准测试
+每次在新进程中计时：导入日志配置（含 sink 初始化）、导入 app.main、
+lifespan 启动（init_db 等）、首个 /health 请求与首个 /openapi.json 请求，
+对比运行时生成文档（runtime）、预生成文档文件（prebuilt，OPENAPI_FILE）
+与关闭文档（no-docs，DOCS_ENABLED=False）
+
+运行: python -m benchmarks.startup [每种模式的次数]
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# (字段, 表头)：logging 导入日志配置，import 导入 app.main，lifespan 启动，
+# health 首个 /health，openapi 首个 /openapi.json，openapi_again 第二个 /openapi.json
+STEPS = [
+    ("logging", "logging"),
+    ("import", "import"),
+    ("lifespan", "lifespan"),
+    ("health", "health"),
+    ("openapi", "openapi"),
+    ("openapi_again", "openapi(2)"),
+]
+
+
+async def child() -> dict:
+    timings = {}
+    start = time.perf_counter()
+    import app.core.logging_config  # noqa: F401
+    timings["logging"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from app.main import app
+    timings["import"] = time.perf_counter() - start
+
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    start = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        timings["lifespan"] = time.perf_counter() - start
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for step, path in [("health", "/health"), ("openapi", "/openapi.json"), ("openapi_again", "/openapi.json")]:
+                begin = time.perf_counter()
+                response = await client.get(path, headers={"Accept-Encoding": "gzip"})
+                timings[step] = time.perf_counter() - begin
+                timings[f"{step}_status"] = response.status_code
+    return timings
+
+
+def run(label: str, runs: int, env: dict) -> None:
+    results = []
+    walls = []
+    for _ in range(runs):
+        begin = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.startup", "--child"],
+            env=env, stdout=subprocess.PIPE, check=True,
+        )
+        walls.append(time.perf_counter() - begin)
+        results.append(json.loads(proc.stdout.decode().strip().splitlines()[-1]))
+
+    cells = []
+    for step, _ in STEPS:
+        value = statistics.median(r[step] for r in results) * 1000
+        status = results[0].get(f"{step}_status")
+        cells.append(f"{value:>8.1f}" + ("" if status in (None, 200) else f"({status})"))
+    print(f"{label:<12}" + "".join(f"{cell:>12}" for cell in cells) + f"{statistics.median(walls) * 1000:>12.1f}")
+
+
+def main(runs: int) -> None:
+    workdir = tempfile.mkdtemp()
+    base = dict(
+        os.environ,
+        DATABASE_URL=f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench_startup.db')}",
+        DOCS_ENABLED="True",
+        OPENAPI_FILE="",
+    )
+    openapi_file = os.path.join(workdir, "openapi.json")
+    subprocess.run(
+        [sys.executable, "build_openapi.py", openapi_file],
+        env=base, stdout=subprocess.DEVNULL, check=True,
+    )
+
+    print(f"各阶段耗时（ms，{runs} 次取中位数，括号内为非 200 状态码；total 为含解释器启动的进程总耗时）")
+    print(f"{'mode':<12}" + "".join(f"{title:>12}" for _, title in STEPS) + f"{'total':>12}")
+    run("runtime", runs, base)
+    run("prebuilt", runs, dict(base, OPENAPI_FILE=openapi_file))
+    run("no-docs", runs, dict(base, DOCS_ENABLED="False"))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        print(json.dumps(asyncio.run(child())))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,61 @@
+"""
+用户列表分页基准测试
+对比 offset 分页与 keyset 分页在不同翻页深度下的单页耗时
+
+运行: python -m benchmarks.user_pagination [用户数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_pagination.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+
+from sqlalchemy import insert  # noqa: E402
+
+from app.core.database import async_session_maker, engine, init_db  # noqa: E402
+from app.crud.user import user_crud  # noqa: E402
+from app.models.user import User  # noqa: E402
+
+PAGE_SIZE = 100
+ROUNDS = 20
+
+
+async def populate(total: int) -> None:
+    await init_db()
+    async with engine.begin() as conn:
+        for start in range(0, total, 10000):
+            await conn.execute(insert(User), [
+                {
+                    "email": f"user{i}@example.com",
+                    "username": f"user{i}",
+                    "hashed_password": "x",
+                }
+                for i in range(start, min(start + 10000, total))
+            ])
+
+
+async def page_latency(**kwargs) -> float:
+    async with async_session_maker() as db:
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            await user_crud.get_list(db, limit=PAGE_SIZE, **kwargs)
+        return (time.perf_counter() - start) / ROUNDS * 1000
+
+
+async def main(total: int) -> None:
+    print(f"populating {total:,} users ...")
+    await populate(total)
+    print(f"{'depth':>10} {'offset (ms)':>12} {'keyset (ms)':>12}")
+    for depth in (0, total // 10, total // 4, total // 2, total - PAGE_SIZE):
+        offset_ms = await page_latency(skip=depth)
+        keyset_ms = await page_latency(after_id=depth)
+        print(f"{depth:>10,} {offset_ms:>12.2f} {keyset_ms:>12.2f}")
+    await engine.dispose()
+    os.remove(DB_PATH)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000))
@@ -0,0 +1,141 @@
+"""
+用户端点响应序列化基准测试
+对比 response_model 校验后序列化与直接序列化 ORM 对象（UserJSONResponse）的耗时：
+先单独测量 100 个用户的序列化，再逐个端点测量完整请求
+
+运行: python -m benchmarks.user_responses [轮数]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+from typing import List
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_responses.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{DB_PATH}"
+os.environ.setdefault("METRICS_ENABLED", "false")
+
+import httpx  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from app.api import responses  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.database import engine, init_db  # noqa: E402
+from app.core.logging_config import logger  # noqa: E402
+from app.core.security import create_access_token  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models.user import User  # noqa: E402
+from app.schemas.user import UserResponse  # noqa: E402
+
+PAGE_SIZE = 100
+USERS = 1000
+
+
+def sample_users(count: int) -> List[User]:
+    now = datetime.now(timezone.utc)
+    return [
+        User(
+            id=i, email=f"user{i}@example.com", username=f"user{i}", full_name=f"用户 {i}",
+            is_active=True, is_superuser=False, created_at=now, updated_at=now,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def serialization_benchmark(rounds: int) -> None:
+    users = sample_users(PAGE_SIZE)
+    adapter = TypeAdapter(List[UserResponse])
+    json_response = JSONResponse.__new__(JSONResponse)
+    orjson_module = responses.orjson
+
+    def jsonable():
+        # FastAPI 0.1xx 旧版本：校验 → 字典 → jsonable_encoder → json.dumps
+        return json_response.render(jsonable_encoder(adapter.dump_python(adapter.validate_python(users))))
+
+    def dump_json():
+        # 新版 FastAPI 的默认路径：校验后由 Pydantic 直接生成 JSON
+        return adapter.dump_json(adapter.validate_python(users))
+
+    def direct_stdlib():
+        responses.orjson = None
+        try:
+            return responses.dumps([responses.user_to_dict(user) for user in users])
+        finally:
+            responses.orjson = orjson_module
+
+    def direct():
+        return responses.dumps([responses.user_to_dict(user) for user in users])
+
+    print(f"序列化 {PAGE_SIZE} 个用户（µs/次）")
+    for name, func in [
+        ("校验 + jsonable_encoder + json", jsonable),
+        ("校验 + Pydantic dump_json", dump_json),
+        ("直接序列化（标准库 json）", direct_stdlib),
+        (f"直接序列化（{'orjson' if orjson_module else '未安装 orjson'}）", direct),
+    ]:
+        seconds = min(timeit.repeat(func, number=rounds, repeat=5)) / rounds
+        print(f"  {name:<34} {seconds * 1e6:>9.1f}")
+
+
+async def populate() -> str:
+    await init_db()
+    now = datetime.now(timezone.utc)
+    async with engine.begin() as conn:
+        await conn.execute(insert(User), [
+            {
+                "email": f"user{i}@example.com",
+                "username": f"user{i}",
+                "full_name": f"用户 {i}",
+                "hashed_password": "x",
+                "is_superuser": i == 0,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(USERS)
+        ])
+    return create_access_token({"sub": "user0"})
+
+
+async def endpoint_latency(client: httpx.AsyncClient, url: str, rounds: int) -> float:
+    for _ in range(20):
+        await client.get(url)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        response = await client.get(url)
+    assert response.status_code == 200, response.text
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+async def endpoint_benchmark(rounds: int) -> None:
+    token = await populate()
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    print()
+    print(f"{'端点':<30} {'response_model (ms)':>20} {'直接序列化 (ms)':>16}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        for url in ("/api/v1/users?limit=100", "/api/v1/users/me", "/api/v1/users/2"):
+            settings.FAST_USER_RESPONSES = False
+            before = await endpoint_latency(client, url, rounds)
+            settings.FAST_USER_RESPONSES = True
+            after = await endpoint_latency(client, url, rounds)
+            print(f"{url:<30} {before:>20.3f} {after:>16.3f}")
+    await engine.dispose()
+    os.remove(DB_PATH)
+
+
+def main(rounds: int) -> None:
+    # 日志写入 /dev/null：保留格式化开销，排除磁盘差异
+    logger.remove()
+    logger.add(os.devnull, level="INFO")
+    serialization_benchmark(rounds)
+    asyncio.run(endpoint_benchmark(rounds))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+部署时预先生成 OpenAPI 文档
+
+生成 openapi.json 及其预压缩文件（.gz，安装了 brotli / zstandard 时还有 .br / .zst）。
+把 OPENAPI_FILE 指向输出路径后，各 worker 直接发送该文件，不再在运行时生成 schema。
+
+用法:
+    python3 build_openapi.py [输出路径]    # 默认使用 OPENAPI_FILE，未设置时为 build/openapi.json
+"""
+import sys
+import time
+from pathlib import Path
+
+
+def main() -> int:
+    started = time.perf_counter()
+    from app.api.openapi import write_openapi_files
+    from app.core.config import settings
+    from app.main import app
+
+    if len(sys.argv) > 1:
+        output = Path(sys.argv[1])
+    else:
+        output = Path(settings.OPENAPI_FILE or "build/openapi.json")
+    for path in write_openapi_files(app, output):
+        print(f"📝 {path} ({path.stat().st_size:,} bytes)")
+    print(f"✅ OpenAPI 文档生成完成，用时 {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,616 @@
+#!/usr/bin/env python3
+"""
+访问日志分析工具
+
+流式读取 access.json 及其 gzip 归档，统计时间窗口内各路由的
+p50/p95/p99 延迟、错误率以及访问最多的用户和 IP。
+
+每个日志文件旁会生成 "<文件名>.idx" 索引，按块记录时间范围、用户、IP、
+路由和状态码类别，重复查询时跳过不相关的文件和块。归档文件的索引只建一次；
+当前正在写入的 access.json 的索引会在文件增长后增量更新。
+
+只依赖标准库（安装了 orjson 时自动使用），可以直接在服务器上运行：
+
+    python3 log_analyzer.py summary --since 24h
+    python3 log_analyzer.py summary --since 2026-01-01 --until 2026-01-07 --path /api/v1/users
+    python3 log_analyzer.py search --user alice --limit 20
+    python3 log_analyzer.py search --min-duration 1000 --sort duration
+    python3 log_analyzer.py index
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+DEFAULT_LOG_DIR = os.environ.get("LOG_DIR", "/var/log/fastapi")
+INDEX_VERSION = 1
+# 每个索引块包含的行数
+BLOCK_LINES = 5000
+# 块内某字段的不同取值超过该数量时不再记录（该字段无法用于跳过此块）
+MAX_BLOCK_VALUES = 500
+
+
+# ---------------------------------------------------------------------------
+# 记录解析
+# ---------------------------------------------------------------------------
+
+def parse_line(line: bytes) -> Optional[Dict[str, Any]]:
+    """
+    解析 access.json 的一行
+
+    兼容两种格式：字段直接位于 record.extra 中（当前格式），
+    以及嵌套在 record.extra.extra 中（旧版中间件）。
+
+    Returns:
+        dict: 访问记录；不是请求日志的行返回 None
+    """
+    try:
+        data = _loads(line)
+    except ValueError:
+        return None
+    record = data.get("record")
+    if not isinstance(record, dict):
+        return None
+    extra = record.get("extra") or {}
+    nested = extra.get("extra")
+    if isinstance(nested, dict):
+        extra = {**extra, **nested}
+    if "path" not in extra:
+        return None
+
+    status = extra.get("status_code")
+    if status is None:
+        # 请求处理过程中抛出异常的日志没有状态码，按 500 统计
+        if "error" not in extra:
+            return None
+        status = 500
+
+    duration = extra.get("duration_ms")
+    if duration is None:
+        process_time = extra.get("process_time")
+        try:
+            duration = float(str(process_time).rstrip("s")) * 1000
+        except ValueError:
+            duration = None
+
+    sample_rate = extra.get("sample_rate") or 1.0
+    return {
+        "ts": (record.get("time") or {}).get("timestamp") or 0.0,
+        "method": extra.get("method", ""),
+        "path": extra["path"],
+        "route": extra.get("route") or extra["path"],
+        "status": int(status),
+        "duration_ms": duration,
+        "user": extra.get("user"),
+        "ip": extra.get("client_ip"),
+        "request_id": extra.get("request_id"),
+        "weight": 1.0 / sample_rate,
+    }
+
+
+# ---------------------------------------------------------------------------
+# 文件与索引
+# ---------------------------------------------------------------------------
+
+def log_files(log_dir: Path) -> List[Path]:
+    """access.json 及其归档文件，按修改时间从旧到新排序"""
+    files = [
+        path for path in log_dir.glob("access*.json*")
+        if path.is_file() and not path.name.endswith((".idx", ".tmp"))
+    ]
+    return sorted(files, key=lambda path: path.stat().st_mtime)
+
+
+def _open(path: Path):
+    return gzip.open(path, "rb") if path.suffix == ".gz" else open(path, "rb")
+
+
+def _index_path(path: Path) -> Path:
+    return path.with_name(path.name + ".idx")
+
+
+class _BlockBuilder:
+    """累积一个索引块的时间范围和字段取值"""
+
+    def __init__(self, offset: int):
+        self.offset = offset
+        self.lines = 0
+        self.end = offset
+        self.min_ts: Optional[float] = None
+        self.max_ts: Optional[float] = None
+        self.fields: Dict[str, Optional[set]] = {
+            "users": set(), "ips": set(), "routes": set(), "status_classes": set(),
+        }
+
+    def add(self, line: bytes) -> None:
+        self.lines += 1
+        self.end += len(line)
+        entry = parse_line(line)
+        if entry is None:
+            return
+        ts = entry["ts"]
+        self.min_ts = ts if self.min_ts is None else min(self.min_ts, ts)
+        self.max_ts = ts if self.max_ts is None else max(self.max_ts, ts)
+        for field, value in (
+            ("users", entry["user"]),
+            ("ips", entry["ip"]),
+            ("routes", entry["route"]),
+            ("status_classes", entry["status"] // 100),
+        ):
+            values = self.fields[field]
+            if values is not None:
+                values.add(value)
+                if len(values) > MAX_BLOCK_VALUES:
+                    self.fields[field] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offset": self.offset,
+            "lines": self.lines,
+            "min_ts": self.min_ts,
+            "max_ts": self.max_ts,
+            **{
+                field: sorted(values, key=str) if values is not None else None
+                for field, values in self.fields.items()
+            },
+        }
+
+
+def build_index(path: Path, previous: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    为日志文件建立（或增量更新）块索引
+
+    Args:
+        path: 日志文件
+        previous: 同一文件之前的索引，文件只追加时从其末尾继续
+
+    Returns:
+        dict: 索引内容
+    """
+    stat = path.stat()
+    blocks = list(previous["blocks"]) if previous else []
+    offset = previous["size"] if previous else 0
+    with _open(path) as f:
+        if offset:
+            f.seek(offset)
+        block = _BlockBuilder(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # 正在写入的最后一行，下次再索引
+                break
+            block.add(line)
+            if block.lines >= BLOCK_LINES:
+                blocks.append(block.to_dict())
+                block = _BlockBuilder(block.end)
+        if block.lines:
+            blocks.append(block.to_dict())
+        offset = block.end
+    return {
+        "version": INDEX_VERSION,
+        "inode": stat.st_ino,
+        "size": offset,
+        "mtime": stat.st_mtime,
+        "compressed": path.suffix == ".gz",
+        "blocks": blocks,
+    }
+
+
+def load_index(path: Path, rebuild: bool = False) -> Dict[str, Any]:
+    """
+    读取文件的索引，缺失或过期时重建并写回
+
+    归档文件（.gz）不会再变化，索引与文件大小、修改时间一致即有效；
+    当前文件只会追加，inode 不变时在已有索引基础上继续索引新增部分。
+    索引无法写入（例如没有目录写权限）时只在内存中使用。
+    """
+    idx_path = _index_path(path)
+    stat = path.stat()
+    previous = None
+    if not rebuild and idx_path.exists():
+        try:
+            previous = json.loads(idx_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            previous = None
+    if previous and previous.get("version") == INDEX_VERSION and previous.get("inode") == stat.st_ino:
+        if previous["compressed"] and previous["mtime"] == stat.st_mtime:
+            return previous
+        if not previous["compressed"]:
+            if previous["size"] == stat.st_size:
+                return previous
+            if previous["size"] < stat.st_size:
+                # 最后一个块可能没写满，去掉后从它的起点重新索引
+                blocks = previous["blocks"]
+                if blocks and blocks[-1]["lines"] < BLOCK_LINES:
+                    tail = blocks[-1]
+                    previous = {**previous, "blocks": blocks[:-1], "size": tail["offset"]}
+                index = build_index(path, previous)
+                _save_index(idx_path, index)
+                return index
+    index = build_index(path)
+    _save_index(idx_path, index)
+    return index
+
+
+def _save_index(idx_path: Path, index: Dict[str, Any]) -> None:
+    tmp = idx_path.with_name(idx_path.name + ".tmp")
+    try:
+        tmp.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, idx_path)
+    except OSError:
+        pass
+
+
+# ---------------------------------------------------------------------------
+# 查询
+# ---------------------------------------------------------------------------
+
+class Query:
+    """查询条件"""
+
+    def __init__(
+        self,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        user: Optional[str] = None,
+        ip: Optional[str] = None,
+        path: Optional[str] = None,
+        status_classes: Optional[List[int]] = None,
+        min_duration: Optional[float] = None,
+        request_id: Optional[str] = None,
+    ):
+        self.since = since
+        self.until = until
+        self.user = user
+        self.ip = ip
+        self.path = path
+        self.status_classes = set(status_classes) if status_classes else None
+        self.min_duration = min_duration
+        self.request_id = request_id
+
+    def block_may_match(self, block: Dict[str, Any]) -> bool:
+        """根据索引块判断块内是否可能有匹配的记录"""
+        if block["min_ts"] is None:
+            return False
+        if self.since is not None and block["max_ts"] < self.since:
+            return False
+        if self.until is not None and block["min_ts"] >= self.until:
+            return False
+        if self.user is not None and block["users"] is not None and self.user not in block["users"]:
+            return False
+        if self.ip is not None and block["ips"] is not None and self.ip not in block["ips"]:
+            return False
+        if self.status_classes is not None and block["status_classes"] is not None:
+            if not self.status_classes.intersection(block["status_classes"]):
+                return False
+        if self.path is not None and block["routes"] is not None:
+            if not any(route.startswith(self.path) for route in block["routes"]):
+                return False
+        return True
+
+    def matches(self, entry: Dict[str, Any]) -> bool:
+        if self.since is not None and entry["ts"] < self.since:
+            return False
+        if self.until is not None and entry["ts"] >= self.until:
+            return False
+        if self.user is not None and entry["user"] != self.user:
+            return False
+        if self.ip is not None and entry["ip"] != self.ip:
+            return False
+        if self.status_classes is not None and entry["status"] // 100 not in self.status_classes:
+            return False
+        if self.path is not None and not (
+            entry["route"].startswith(self.path) or entry["path"].startswith(self.path)
+        ):
+            return False
+        if self.min_duration is not None and (entry["duration_ms"] or 0) < self.min_duration:
+            return False
+        if self.request_id is not None and entry["request_id"] != self.request_id:
+            return False
+        return True
+
+    def needle(self) -> Optional[bytes]:
+        """JSON 解析前用于快速过滤行的子串"""
+        value = self.request_id or self.user or self.ip
+        return value.encode("utf-8") if value else None
+
+
+def scan(log_dir: Path, query: Query, stats: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    按索引扫描日志，逐条产出匹配的访问记录
+
+    Args:
+        log_dir: 日志目录
+        query: 查询条件
+        stats: 传入时累计扫描的文件数、块数和跳过的块数
+    """
+    stats = stats if stats is not None else {}
+    needle = query.needle()
+    for path in log_files(log_dir):
+        index = load_index(path)
+        blocks = [block for block in index["blocks"] if query.block_may_match(block)]
+        stats["files"] = stats.get("files", 0) + 1
+        stats["blocks"] = stats.get("blocks", 0) + len(index["blocks"])
+        stats["blocks_skipped"] = stats.get("blocks_skipped", 0) + len(index["blocks"]) - len(blocks)
+        if not blocks:
+            continue
+        with _open(path) as f:
+            for block in blocks:
+                f.seek(block["offset"])
+                for _ in range(block["lines"]):
+                    line = f.readline()
+                    if needle is not None and needle not in line:
+                        continue
+                    entry = parse_line(line)
+                    if entry is not None and query.matches(entry):
+                        yield entry
+
+
+def weighted_percentile(values: List[Tuple[float, float]], q: float) -> Optional[float]:
+    """
+    加权分位数
+
+    Args:
+        values: 已按值排序的 (值, 权重) 列表
+        q: 分位（0~1）
+    """
+    if not values:
+        return None
+    total = sum(weight for _, weight in values)
+    target = q * total
+    acc = 0.0
+    for value, weight in values:
+        acc += weight
+        if acc >= target:
+            return value
+    return values[-1][0]
+
+
+def summarize(entries: Iterator[Dict[str, Any]], top: int = 10) -> Dict[str, Any]:
+    """
+    统计请求量、错误率、各路由延迟分位数和访问最多的用户/IP
+
+    采样记录的日志按 1 / sample_rate 加权。
+    """
+    routes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    users: Dict[str, float] = {}
+    ips: Dict[str, float] = {}
+    total = errors_4xx = errors_5xx = 0.0
+    first_ts = last_ts = None
+    for entry in entries:
+        weight = entry["weight"]
+        total += weight
+        first_ts = entry["ts"] if first_ts is None else min(first_ts, entry["ts"])
+        last_ts = entry["ts"] if last_ts is None else max(last_ts, entry["ts"])
+        route = routes.setdefault(
+            (entry["method"], entry["route"]),
+            {"count": 0.0, "4xx": 0.0, "5xx": 0.0, "durations": []},
+        )
+        route["count"] += weight
+        if 400 <= entry["status"] < 500:
+            route["4xx"] += weight
+            errors_4xx += weight
+        elif entry["status"] >= 500:
+            route["5xx"] += weight
+            errors_5xx += weight
+        if entry["duration_ms"] is not None:
+            route["durations"].append((entry["duration_ms"], weight))
+        if entry["user"]:
+            users[entry["user"]] = users.get(entry["user"], 0.0) + weight
+        if entry["ip"]:
+            ips[entry["ip"]] = ips.get(entry["ip"], 0.0) + weight
+
+    route_rows = []
+    for (method, route), data in routes.items():
+        durations = sorted(data["durations"])
+        route_rows.append({
+            "method": method,
+            "route": route,
+            "count": round(data["count"]),
+            "error_rate": round((data["4xx"] + data["5xx"]) / data["count"], 4),
+            "5xx_rate": round(data["5xx"] / data["count"], 4),
+            "p50_ms": weighted_percentile(durations, 0.50),
+            "p95_ms": weighted_percentile(durations, 0.95),
+            "p99_ms": weighted_percentile(durations, 0.99),
+            "max_ms": durations[-1][0] if durations else None,
+        })
+    route_rows.sort(key=lambda row: row["count"], reverse=True)
+    return {
+        "from": first_ts,
+        "to": last_ts,
+        "requests": round(total),
+        "error_rate": round((errors_4xx + errors_5xx) / total, 4) if total else 0.0,
+        "4xx": round(errors_4xx),
+        "5xx": round(errors_5xx),
+        "routes": route_rows,
+        "top_users": sorted(users.items(), key=lambda item: item[1], reverse=True)[:top],
+        "top_ips": sorted(ips.items(), key=lambda item: item[1], reverse=True)[:top],
+    }
+
+
+# ---------------------------------------------------------------------------
+# 命令行
+# ---------------------------------------------------------------------------
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """
+    解析时间参数
+
+    支持相对时间（30m、24h、7d）、today 以及 ISO 格式的日期/时间（按本地时区）。
+    """
+    if value is None:
+        return None
+    match = re.fullmatch(r"(\d+)([smhd])", value)
+    if match:
+        seconds = {"s": 1, "m": 60, "h": 3600, "d": 86400}[match.group(2)]
+        return time.time() - int(match.group(1)) * seconds
+    if value == "today":
+        return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    if value == "yesterday":
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        return (today - timedelta(days=1)).timestamp()
+    return datetime.fromisoformat(value).timestamp()
+
+
+def _format_ts(ts: Optional[float]) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S") if ts else "-"
+
+
+def _width(text: str) -> int:
+    return sum(2 if unicodedata.east_asian_width(char) in "WF" else 1 for char in text)
+
+
+def _ljust(text: str, width: int) -> str:
+    return text + " " * max(0, width - _width(text))
+
+
+def _rjust(text: str, width: int) -> str:
+    return " " * max(0, width - _width(text)) + text
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def print_summary(result: Dict[str, Any], limit: int) -> None:
+    print(f"📅 时间范围: {_format_ts(result['from'])} ~ {_format_ts(result['to'])}")
+    print(f"📊 请求总数: {result['requests']}  "
+          f"错误率: {result['error_rate']:.2%}  4xx: {result['4xx']}  5xx: {result['5xx']}")
+    print()
+    print("🛣️  路由延迟（毫秒）")
+    print(
+        _ljust("方法", 8) + _ljust("路由", 44) + _rjust("请求数", 10) + _rjust("错误率", 10)
+        + "".join(_rjust(name, 10) for name in ("p50", "p95", "p99", "max"))
+    )
+    for row in result["routes"][:limit]:
+        print(
+            _ljust(row["method"], 8) + _ljust(row["route"][:43], 44)
+            + _rjust(str(row["count"]), 10) + _rjust(f"{row['error_rate']:.2%}", 10)
+            + "".join(
+                _rjust(_format_ms(row[key]), 10) for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")
+            )
+        )
+    print()
+    print("👤 TOP 用户")
+    for user, count in result["top_users"]:
+        print(f"  {round(count):>9}  {user}")
+    print()
+    print("🌍 TOP IP")
+    for ip, count in result["top_ips"]:
+        print(f"  {round(count):>9}  {ip}")
+
+
+def print_entry(entry: Dict[str, Any]) -> None:
+    print(
+        f"{_format_ts(entry['ts'])}  {entry['status']}  {entry['method']:<6} {entry['path']}  "
+        f"{_format_ms(entry['duration_ms'])}ms  user={entry['user']}  ip={entry['ip']}  "
+        f"id={entry['request_id']}"
+    )
+
+
+def _add_filters(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--since", help="开始时间：30m / 24h / 7d / today / 2026-01-07 / 2026-01-07T12:00")
+    parser.add_argument("--until", help="结束时间（格式同 --since）")
+    parser.add_argument("--user", help="用户名")
+    parser.add_argument("--ip", help="客户端 IP")
+    parser.add_argument("--path", help="路由或路径前缀，例如 /api/v1/users")
+    parser.add_argument("--status", help="状态码类别，逗号分隔，例如 4,5")
+    parser.add_argument("--min-duration", type=float, help="最小耗时（毫秒）")
+    parser.add_argument("--request-id", help="请求 ID（X-Request-ID）")
+
+
+def _build_query(args: argparse.Namespace) -> Query:
+    return Query(
+        since=parse_time(args.since),
+        until=parse_time(args.until),
+        user=args.user,
+        ip=args.ip,
+        path=args.path,
+        status_classes=[int(item) for item in args.status.split(",")] if args.status else None,
+        min_duration=args.min_duration,
+        request_id=args.request_id,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="FastAPI 访问日志分析工具")
+    parser.add_argument("--log-dir", default=DEFAULT_LOG_DIR, help=f"日志目录（默认 {DEFAULT_LOG_DIR}）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summary_parser = subparsers.add_parser("summary", help="统计延迟分位数、错误率和 TOP 用户/IP")
+    _add_filters(summary_parser)
+    summary_parser.add_argument("--top", type=int, default=10, help="TOP 用户/IP 数量")
+    summary_parser.add_argument("--limit", type=int, default=30, help="最多显示的路由数")
+    summary_parser.add_argument("--json", action="store_true", help="以 JSON 输出")
+
+    search_parser = subparsers.add_parser("search", help="列出匹配的请求")
+    _add_filters(search_parser)
+    search_parser.add_argument("--limit", type=int, default=50, help="最多显示条数（默认显示最近的）")
+    search_parser.add_argument("--sort", choices=["time", "duration"], default="time", help="排序方式")
+    search_parser.add_argument("--json", action="store_true", help="以 JSON Lines 输出")
+
+    index_parser = subparsers.add_parser("index", help="建立或更新所有日志文件的索引")
+    index_parser.add_argument("--rebuild", action="store_true", help="忽略已有索引全部重建")
+
+    args = parser.parse_args(argv)
+    log_dir = Path(args.log_dir)
+    if not log_dir.is_dir():
+        print(f"❌ 日志目录不存在: {log_dir}", file=sys.stderr)
+        return 1
+
+    if args.command == "index":
+        for idx_path in log_dir.glob("*.idx"):
+            if not idx_path.with_name(idx_path.name[:-len(".idx")]).exists():
+                idx_path.unlink()
+        for path in log_files(log_dir):
+            started = time.perf_counter()
+            index = load_index(path, rebuild=args.rebuild)
+            lines = sum(block["lines"] for block in index["blocks"])
+            print(f"📇 {path.name}: {lines} 行，{len(index['blocks'])} 块，{time.perf_counter() - started:.2f}s")
+        return 0
+
+    query = _build_query(args)
+    stats: Dict[str, int] = {}
+    entries = scan(log_dir, query, stats)
+
+    if args.command == "summary":
+        result = summarize(entries, top=args.top)
+        if args.json:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        else:
+            print_summary(result, args.limit)
+    else:
+        if args.sort == "duration":
+            matched = sorted(entries, key=lambda entry: entry["duration_ms"] or 0, reverse=True)[:args.limit]
+        else:
+            matched = deque(entries, maxlen=args.limit)
+        for entry in matched:
+            if args.json:
+                print(json.dumps(entry, ensure_ascii=False))
+            else:
+                print_entry(entry)
+
+    print(
+        f"\n🔎 扫描 {stats.get('files', 0)} 个文件，跳过 "
+        f"{stats.get('blocks_skipped', 0)}/{stats.get('blocks', 0)} 个块",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
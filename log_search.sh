@@ -11,21 +11,26 @@ show_help() {
     echo "选项："
     echo "  user <username>      搜索特定用户的所有日志"
     echo "  ip <ip_address>      搜索特定 IP 的所有日志"
+    echo "  id <request_id>      查看单个请求的访问记录和应用日志（X-Request-ID）"
     echo "  error                搜索所有错误日志"
-    echo "  slow                 搜索慢查询日志"
-    echo "  today                搜索今天的日志"
-    echo "  range <start> <end>  搜索时间范围内的日志"
+    echo "  slow [ms]            按耗时列出慢请求（默认超过 1000ms）"
+    echo "  today                今天各路由的延迟分位数、错误率和 TOP 用户/IP"
+    echo "  range <start> <end>  时间范围内的统计（end 不含当天，例如 2026-01-01 2026-01-08）"
+    echo "  index                建立/更新日志索引（可放入 cron，加快后续查询）"
     echo "  clean                清理压缩的旧日志"
     echo "  size                 查看日志文件大小"
     echo ""
     echo "示例："
     echo "  ./log_search.sh user alice"
     echo "  ./log_search.sh ip 192.168.1.100"
-    echo "  ./log_search.sh slow"
+    echo "  ./log_search.sh slow 500"
+    echo ""
+    echo "更多查询条件见: python3 log_analyzer.py --help"
     echo ""
 }
 
-LOG_DIR="/var/log/fastapi"
+LOG_DIR="${LOG_DIR:-/var/log/fastapi}"
+ANALYZER="python3 $(dirname "$0")/log_analyzer.py --log-dir $LOG_DIR"
 
 # 搜索特定用户
 search_user() {
@@ -34,25 +39,8 @@ search_user() {
     echo "================================"
     echo ""
     
-    # 搜索当前日志
-    echo "📝 当前日志："
-    grep -n "user.*$username" "$LOG_DIR/app.log" 2>/dev/null | tail -50
-    
-    # 搜索 JSON 日志
-    echo ""
-    echo "📄 JSON 日志："
-    grep "\"user\": \"$username\"" "$LOG_DIR/access.json" 2>/dev/null | \
-        python3 -m json.tool 2>/dev/null | head -100
-    
-    # 搜索归档日志
-    echo ""
-    echo "📦 归档日志："
-    for file in "$LOG_DIR"/app.log.*.gz; do
-        if [ -f "$file" ]; then
-            echo "检查: $file"
-            zgrep "user.*$username" "$file" 2>/dev/null | tail -20
-        fi
-    done
+    # 按索引扫描 access.json 及归档，只读取包含该用户的块
+    $ANALYZER search --user "$username" --limit 100
 }
 
 # 搜索特定 IP
@@ -62,16 +50,29 @@ search_ip() {
     echo "================================"
     echo ""
     
-    echo "📝 当前日志："
-    grep -n "$ip" "$LOG_DIR/app.log" 2>/dev/null | tail -50
+    echo "📝 最近请求："
+    $ANALYZER search --ip "$ip" --limit 50
     
     # 统计该 IP 的请求
     echo ""
     echo "📊 请求统计："
-    TOTAL=$(grep "$ip" "$LOG_DIR/app.log" 2>/dev/null | grep "Incoming" | wc -l)
-    ERRORS=$(grep "$ip" "$LOG_DIR/app.log" 2>/dev/null | grep -E "❌|⚠️" | wc -l)
-    echo "总请求数: $TOTAL"
-    echo "错误请求: $ERRORS"
+    $ANALYZER summary --ip "$ip" --limit 10 --top 5
+}
+
+# 按请求 ID 查看单个请求
+search_request_id() {
+    local request_id="$1"
+    echo "🔗 请求: $request_id"
+    echo "================================"
+    echo ""
+    
+    echo "📝 访问记录："
+    $ANALYZER search --request-id "$request_id" --limit 10
+    
+    # 文本日志的每一行都带有请求 ID
+    echo ""
+    echo "📝 应用日志："
+    grep -hF -- "| $request_id |" "$LOG_DIR/app.log" "$LOG_DIR/error.log" 2>/dev/null
 }
 
 # 搜索错误日志
@@ -86,44 +87,29 @@ search_errors() {
         tail -100 "$LOG_DIR/error.log"
     fi
     
-    # 从应用日志
+    # 从访问日志
     echo ""
-    echo "📝 应用日志中的错误："
-    grep -E "ERROR|CRITICAL|❌|💥" "$LOG_DIR/app.log" 2>/dev/null | tail -50
+    echo "📝 最近的 5xx 请求："
+    $ANALYZER search --status 5 --limit 50
 }
 
 # 搜索慢查询
 search_slow() {
-    echo "🐌 慢查询日志"
+    local threshold_ms="${1:-1000}"
+    echo "🐌 慢请求（超过 ${threshold_ms}ms），按耗时排序"
     echo "================================"
     echo ""
     
-    grep "Slow request" "$LOG_DIR/app.log" 2>/dev/null | tail -50
-    
-    # 统计
-    echo ""
-    echo "📊 慢查询统计："
-    COUNT=$(grep "Slow request" "$LOG_DIR/app.log" 2>/dev/null | wc -l)
-    echo "慢查询总数: $COUNT"
-    
-    if [ $COUNT -gt 0 ]; then
-        echo ""
-        echo "🔝 最慢的 10 个请求："
-        grep "Slow request" "$LOG_DIR/app.log" 2>/dev/null | \
-            grep -oE "took [0-9.]+s" | \
-            sort -t' ' -k2 -rn | \
-            head -10
-    fi
+    $ANALYZER search --min-duration "$threshold_ms" --sort duration --limit 50
 }
 
 # 搜索今天的日志
 search_today() {
-    local today=$(date +%Y-%m-%d)
-    echo "📅 今天的日志: $today"
+    echo "📅 今天的请求统计: $(date +%Y-%m-%d)"
     echo "================================"
     echo ""
     
-    grep "$today" "$LOG_DIR/app.log" 2>/dev/null | tail -100
+    $ANALYZER summary --since today
 }
 
 # 搜索时间范围
@@ -135,23 +121,7 @@ search_range() {
     echo "================================"
     echo ""
     
-    # 搜索当前日志
-    awk -v start="$start_date" -v end="$end_date" \
-        '$0 ~ start,$0 ~ end' "$LOG_DIR/app.log" 2>/dev/null
-    
-    # 搜索归档日志
-    for file in "$LOG_DIR"/app.log.*.gz; do
-        if [ -f "$file" ]; then
-            filename=$(basename "$file")
-            file_date=${filename#app.log.}
-            file_date=${file_date%.gz}
-            
-            if [[ "$file_date" > "$start_date" ]] && [[ "$file_date" < "$end_date" ]]; then
-                echo "检查归档: $file"
-                zcat "$file" | head -100
-            fi
-        fi
-    done
+    $ANALYZER summary --since "$start_date" --until "$end_date"
 }
 
 # 清理旧日志
@@ -167,6 +137,7 @@ clean_old_logs() {
     echo ""
     echo "🗑️  删除 14 天前的日志..."
     find "$LOG_DIR" -name "*.gz" -mtime +14 -delete -print
+    find "$LOG_DIR" -name "*.gz.idx" -mtime +14 -delete -print
     
     echo ""
     echo "📊 清理后的文件："
@@ -211,12 +182,21 @@ case "$1" in
         search_ip "$2"
         ;;
     
+    id)
+        if [ -z "$2" ]; then
+            echo "❌ 请提供请求 ID"
+            echo "用法: $0 id <request_id>"
+            exit 1
+        fi
+        search_request_id "$2"
+        ;;
+    
     error)
         search_errors
         ;;
     
     slow)
-        search_slow
+        search_slow "$2"
         ;;
     
     today)
@@ -232,6 +212,10 @@ case "$1" in
         search_range "$2" "$3"
         ;;
     
+    index)
+        $ANALYZER index
+        ;;
+    
     clean)
         clean_old_logs
         ;;
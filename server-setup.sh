@@ -119,7 +119,17 @@ User=$USER
 Group=$USER
 WorkingDirectory=$CURRENT_DIR
 Environment="PATH=$CURRENT_DIR/venv/bin"
-
+Environment="METRICS_MULTIPROC_DIR=/tmp/fastapi-metrics"
+Environment="OPENAPI_FILE=/tmp/fastapi-openapi/openapi.json"
+# 多 worker 之间通过 Unix 套接字广播缓存失效（默认后端，PrivateTmp 下 /tmp 为本服务独占）
+Environment="INVALIDATION_SOCKET_DIR=/tmp/fastapi-invalidation"
+# 文件日志由后台线程写入，轮转交给 logrotate（见下方 /etc/logrotate.d/fastapi-backend）
+Environment="LOG_ASYNC=True"
+
+# 多 worker 指标快照目录，每次启动前清空
+ExecStartPre=/bin/rm -rf /tmp/fastapi-metrics
+# 启动前生成 OpenAPI 文档，各 worker 直接发送该文件（与代码版本保持一致）
+ExecStartPre=$CURRENT_DIR/venv/bin/python build_openapi.py /tmp/fastapi-openapi/openapi.json
 ExecStart=$CURRENT_DIR/venv/bin/gunicorn app.main:app \\
     --workers 4 \\
     --worker-class uvicorn.workers.UvicornWorker \\
@@ -138,6 +148,35 @@ EOF
 
 echo "✅ Systemd 服务文件创建完成"
 
+# 应用日志由 logrotate 统一轮转（各 worker 不再自行轮转，避免互相覆盖归档）
+sudo tee /etc/logrotate.d/fastapi-backend > /dev/null <<EOF
+/var/log/fastapi/app.log /var/log/fastapi/access.json {
+    su $USER $USER
+    daily
+    rotate 7
+    dateext
+    compress
+    delaycompress
+    missingok
+    notifempty
+}
+
+/var/log/fastapi/error.log {
+    su $USER $USER
+    daily
+    maxsize 100M
+    rotate 30
+    dateext
+    dateformat -%Y%m%d-%s
+    compress
+    delaycompress
+    missingok
+    notifempty
+}
+EOF
+
+echo "✅ 日志轮转配置完成"
+
 # 7. 配置 Nginx
 echo ""
 echo "🌐 步骤 7/8: 配置 Nginx 反向代理..."
@@ -155,12 +194,21 @@ server {
     error_log /var/log/nginx/fastapi-error.log;
 
     # 反向代理到 FastAPI
+    # 响应由应用压缩（COMPRESSION_ENABLED），这里不开启 gzip，避免重复压缩
     location / {
         proxy_pass http://127.0.0.1:8000;
         proxy_set_header Host \$host;
         proxy_set_header X-Real-IP \$remote_addr;
         proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
         proxy_set_header X-Forwarded-Proto \$scheme;
+        proxy_set_header X-Request-ID \$request_id;
+    }
+
+    # 指标端点只允许本机抓取
+    location = /metrics {
+        allow 127.0.0.1;
+        deny all;
+        proxy_pass http://127.0.0.1:8000;
     }
 
     # 文件上传大小限制
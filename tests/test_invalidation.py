@@ -0,0 +1,182 @@
+"""
+缓存失效通知总线测试
+unix 后端用两个套接字模拟两个 worker，redis 后端使用 fakeredis
+
+运行: pip install pytest fakeredis && python -m pytest -q tests
+"""
+import asyncio
+import os
+import socket
+import stat
+
+import pytest
+
+from app.core.invalidation import RedisInvalidationBus, UnixSocketInvalidationBus, default_socket_dir
+
+
+async def _wait_for(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("等待失效消息超时")
+        await asyncio.sleep(0.01)
+
+
+async def _start_unix_pair(monkeypatch, socket_dir):
+    """在同一进程内启动两个 worker 的总线（套接字文件名取自 pid）"""
+    buses = []
+    for pid in (1001, 1002):
+        bus = UnixSocketInvalidationBus(str(socket_dir))
+        monkeypatch.setattr(os, "getpid", lambda pid=pid: pid)
+        await bus.start()
+        buses.append(bus)
+    monkeypatch.undo()
+    return buses
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix 套接字")
+def test_unix_round_trip(monkeypatch, tmp_path):
+    socket_dir = tmp_path / "bus"
+
+    async def scenario():
+        sender, receiver = await _start_unix_pair(monkeypatch, socket_dir)
+        sent, received = [], []
+        sender.subscribe(sent.append)
+        receiver.subscribe(received.append)
+        try:
+            sender.publish("user:alice")
+            await _wait_for(lambda: received)
+            await asyncio.sleep(0.05)
+        finally:
+            await sender.stop()
+            await receiver.stop()
+        return sent, received
+
+    sent, received = asyncio.run(scenario())
+    assert received == ["user:alice"]
+    # 发送方只在本进程内分发一次，不会收到自己广播的消息
+    assert sent == ["user:alice"]
+    assert stat.S_IMODE(os.stat(socket_dir).st_mode) == 0o700
+    assert not list(socket_dir.iterdir())
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix 套接字")
+def test_unix_ignores_malformed_messages(monkeypatch, tmp_path):
+    socket_dir = tmp_path / "bus"
+
+    async def scenario():
+        sender, receiver = await _start_unix_pair(monkeypatch, socket_dir)
+        received = []
+        receiver.subscribe(received.append)
+        raw = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            for data in (b"\xff\xfe", b"no-separator", b"user:"):
+                raw.sendto(data, str(receiver._path))
+            sender.publish("user:bob")
+            await _wait_for(lambda: received)
+        finally:
+            raw.close()
+            await sender.stop()
+            await receiver.stop()
+        return receiver, received
+
+    receiver, received = asyncio.run(scenario())
+    assert received == ["user:bob"]
+    assert receiver.malformed == 3
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix 套接字")
+def test_unix_tightens_existing_directory(tmp_path):
+    socket_dir = tmp_path / "bus"
+    socket_dir.mkdir(mode=0o755)
+    os.chmod(socket_dir, 0o755)
+
+    async def scenario():
+        bus = UnixSocketInvalidationBus(str(socket_dir))
+        await bus.start()
+        await bus.stop()
+
+    asyncio.run(scenario())
+    assert stat.S_IMODE(os.stat(socket_dir).st_mode) == 0o700
+
+
+@pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 Unix 套接字")
+def test_default_socket_dir_is_per_user(monkeypatch, tmp_path):
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    shared = default_socket_dir()
+    assert f"-{os.getuid()}-" in shared.name
+    assert shared == default_socket_dir()
+
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert default_socket_dir().parent == tmp_path
+
+
+def test_redis_round_trip():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        sender = RedisInvalidationBus("test:invalidation", fakeredis.aioredis.FakeRedis(server=server))
+        receiver = RedisInvalidationBus("test:invalidation", fakeredis.aioredis.FakeRedis(server=server))
+        sent, received = [], []
+        sender.subscribe(sent.append)
+        receiver.subscribe(received.append)
+        await sender.start()
+        await receiver.start()
+        try:
+            # 等待两个订阅生效
+            await asyncio.sleep(0.05)
+            sender.publish("user:alice")
+            await _wait_for(lambda: received)
+            await receiver._client.publish("test:invalidation", "other-node|garbage")
+            await asyncio.sleep(0.05)
+        finally:
+            await sender.stop()
+            await receiver.stop()
+        return sent, received, receiver
+
+    sent, received, receiver = asyncio.run(scenario())
+    assert received == ["user:alice"]
+    assert sent == ["user:alice"]
+    assert receiver.malformed == 1
+
+
+def test_redis_resubscribes_after_connection_loss():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def scenario():
+        server = fakeredis.FakeServer()
+        sender = RedisInvalidationBus("test:invalidation", fakeredis.aioredis.FakeRedis(server=server))
+        receiver = RedisInvalidationBus("test:invalidation", fakeredis.aioredis.FakeRedis(server=server))
+        receiver.RECONNECT_MIN_DELAY = 0.01
+        received, resets = [], []
+        receiver.subscribe(received.append, on_reset=lambda: resets.append(True))
+        await sender.start()
+        await receiver.start()
+
+        async def connection_lost(*args, **kwargs):
+            raise ConnectionError("connection lost")
+
+        try:
+            await asyncio.sleep(0.05)
+            receiver._pubsub.parse_response = connection_lost
+            # 唤醒阻塞中的读取，下一次读取时连接断开
+            sender.publish("user:alice")
+            await _wait_for(lambda: resets)
+            await asyncio.sleep(0.05)
+            sender.publish("user:bob")
+            await _wait_for(lambda: "user:bob" in received)
+        finally:
+            await sender.stop()
+            await receiver.stop()
+        return receiver, resets
+
+    receiver, resets = asyncio.run(scenario())
+    assert resets == [True]
+    assert receiver.resets == 1
+
+
+def test_token_handler_ignores_invalid_digest():
+    from app.core.security import _handle_invalidation
+
+    _handle_invalidation("token:not-hex")
@@ -0,0 +1,36 @@
+"""
+Token 吊销测试
+
+运行: pip install pytest && python -m pytest -q tests
+"""
+import time
+from datetime import timedelta
+
+from app.core import security
+from app.core.cache import ExpiringSet
+
+
+def test_expiring_set_rejects_instead_of_evicting():
+    revoked = ExpiringSet(maxsize=2)
+    now = time.monotonic()
+    assert revoked.add("a", now + 60)
+    assert revoked.add("b", now + 60)
+    assert not revoked.add("c", now + 60)
+    assert revoked.rejected == 1
+    assert "a" in revoked and "b" in revoked and "c" not in revoked
+
+
+def test_expiring_set_frees_expired_entries():
+    revoked = ExpiringSet(maxsize=1)
+    assert revoked.add("a", time.monotonic() - 1)
+    assert "a" not in revoked
+    assert revoked.add("b", time.monotonic() + 60)
+    assert len(revoked) == 1
+
+
+def test_revoked_token_is_rejected(monkeypatch):
+    monkeypatch.setattr(security, "revoked_tokens", ExpiringSet(maxsize=10))
+    token = security.create_access_token({"sub": "alice"}, expires_delta=timedelta(minutes=5))
+    assert security.decode_access_token(token)["sub"] == "alice"
+    assert security.revoke_access_token(token)
+    assert security.decode_access_token(token) is None
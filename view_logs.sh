@@ -19,7 +19,8 @@ show_help() {
     echo ""
 }
 
-LOG_DIR="/var/log/fastapi"
+LOG_DIR="${LOG_DIR:-/var/log/fastapi}"
+ANALYZER="python3 $(dirname "$0")/log_analyzer.py --log-dir $LOG_DIR"
 
 case "$1" in
     access)
@@ -38,8 +39,8 @@ case "$1" in
         ;;
     
     json)
-        echo "📄 JSON 日志（最近 10 条）："
-        tail -10 $LOG_DIR/access.json 2>/dev/null | python3 -m json.tool || echo "JSON 日志文件不存在"
+        echo "📄 JSON 访问日志（最近 10 条）："
+        $ANALYZER search --since 1h --limit 10 --json
         ;;
     
     live)
@@ -57,24 +58,7 @@ case "$1" in
         
         echo ""
         echo "📈 今日请求统计："
-        TODAY=$(date +%Y-%m-%d)
-        if [ -f "/var/log/fastapi-access.log" ]; then
-            TOTAL=$(grep "$TODAY" /var/log/fastapi-access.log 2>/dev/null | wc -l)
-            SUCCESS=$(grep "$TODAY" /var/log/fastapi-access.log 2>/dev/null | grep -E " 200| 201" | wc -l)
-            ERRORS=$(grep "$TODAY" /var/log/fastapi-access.log 2>/dev/null | grep -E " 4[0-9][0-9]| 5[0-9][0-9]" | wc -l)
-            
-            echo "总请求数: $TOTAL"
-            echo "成功请求: $SUCCESS"
-            echo "错误请求: $ERRORS"
-        fi
-        
-        echo ""
-        echo "🌍 TOP 10 访问 IP："
-        grep -oE '[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}' /var/log/fastapi-access.log 2>/dev/null | sort | uniq -c | sort -rn | head -10
-        
-        echo ""
-        echo "🔝 TOP 10 访问路径："
-        awk '{print $2}' /var/log/fastapi-access.log 2>/dev/null | sort | uniq -c | sort -rn | head -10
+        $ANALYZER summary --since today --limit 10
         ;;
     
     search)